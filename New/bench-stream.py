@@ -0,0 +1,120 @@
+import argparse
+import os
+import threading
+import time
+
+import cv2
+
+# ==========================================================
+#        /video_feed LOAD TEST (1, 5, 20 VIEWERS)
+# ==========================================================
+# in-process, old per-viewer encoder vs the shared broadcaster:
+#   python bench-stream.py                 (on the Pi)
+#   PYTHONPATH=../sim python bench-stream.py   (anywhere)
+# against a running server (CPU read from /proc/<pid> of uvicorn):
+#   python bench-stream.py --url http://robot:8000/video_feed --pid 1234
+
+SECONDS = 10
+
+
+def per_viewer_frames(camera):
+    """The old generate_frames(): its own capture + encode per viewer."""
+    while True:
+        frame = camera.capture_main()
+        ok, jpeg = cv2.imencode(".jpg", frame)
+        if ok:
+            yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg.tobytes() + b"\r\n"
+
+
+def proc_cpu(pid=None):
+    """CPU seconds used so far by this process, or by ``pid`` via /proc."""
+    if pid is None:
+        return time.process_time()
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def run_viewers(n, open_stream, slow_every=0, pid=None, slow_kbps=2000):
+    """n viewer threads for SECONDS; every ``slow_every``-th one drains
+    like a ``slow_kbps`` link.  Returns (cpu %, frames per viewer per second)."""
+    stop = threading.Event()
+    counts = [0] * n
+
+    def viewer(i):
+        slow = slow_every and i % slow_every == slow_every - 1
+        stream = open_stream()
+        for part in stream:
+            counts[i] += 1
+            if slow:
+                time.sleep(len(part) * 8 / (slow_kbps * 1000))
+            if stop.is_set():
+                break
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+
+    threads = [threading.Thread(target=viewer, args=(i,), daemon=True) for i in range(n)]
+    cpu0, t0 = proc_cpu(pid), time.monotonic()
+    for t in threads:
+        t.start()
+    time.sleep(SECONDS)
+    stop.set()
+    cpu = proc_cpu(pid) - cpu0
+    wall = time.monotonic() - t0
+    for t in threads:
+        t.join(timeout=2)
+    return 100 * cpu / wall, sum(counts) / n / wall
+
+
+def http_stream(url):
+    import requests
+
+    def parts():
+        with requests.get(url, stream=True, timeout=5) as resp:
+            buf = b""
+            for chunk in resp.iter_content(65536):
+                buf += chunk
+                while True:
+                    start = buf.find(b"--frame")
+                    end = buf.find(b"--frame", start + 7)
+                    if start < 0 or end < 0:
+                        break
+                    yield buf[start:end]
+                    buf = buf[end:]
+    return parts()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU and fps of /video_feed with many viewers.")
+    parser.add_argument("--url", help="stream URL of a running server instead of in-process")
+    parser.add_argument("--pid", type=int, help="server pid for CPU use (with --url)")
+    parser.add_argument("--viewers", type=int, nargs="*", default=[1, 5, 20])
+    parser.add_argument("--slow-every", type=int, default=5, help="every n-th viewer is on a slow link")
+    parser.add_argument("--slow-kbps", type=int, default=2000, help="bandwidth of the slow viewers")
+    args = parser.parse_args()
+
+    print(f"{SECONDS} s per run, every {args.slow_every}th viewer on a {args.slow_kbps} kbit/s link")
+    if args.url:
+        for n in args.viewers:
+            cpu, fps = run_viewers(n, lambda: http_stream(args.url), args.slow_every, args.pid, args.slow_kbps)
+            cpu_text = f"{cpu:6.1f} % CPU" if args.pid else "  (no --pid)"
+            print(f"{n:3d} viewers  {cpu_text}  {fps:5.1f} fps per viewer")
+        return
+
+    from cam import camera, start_camera, MjpegBroadcaster
+    start_camera()
+    for n in args.viewers:
+        cpu_old, fps_old = run_viewers(n, lambda: per_viewer_frames(camera), args.slow_every,
+                                       slow_kbps=args.slow_kbps)
+        broadcaster = MjpegBroadcaster(camera)
+        cpu_new, fps_new = run_viewers(n, broadcaster.stream, args.slow_every, slow_kbps=args.slow_kbps)
+        print(f"{n:3d} viewers  per-viewer encode {cpu_old:6.1f} % CPU {fps_old:5.1f} fps | "
+              f"shared {cpu_new:6.1f} % CPU {fps_new:5.1f} fps "
+              f"({broadcaster.encoded} encodes, {broadcaster.sent} parts sent)")
+        time.sleep(broadcaster.idle_after + 0.5)
+        print(f"             after viewers left: encoder running = {broadcaster.thread is not None}")
+
+
+if __name__ == "__main__":
+    main()
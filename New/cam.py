@@ -1,23 +1,188 @@
-from picamera2 import Picamera2
 import cv2
+import os
+import sys
+import threading
+import time
 
-picam2 = Picamera2()
+# capture.py, the robot's one camera module, lives in the repo root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from capture import CaptureService, DualStreamCamera, FramePool
+
+# the high-resolution main stream (960x960) is what operators watch here
+camera = DualStreamCamera(lores_size=None)
 
 def start_camera():
-    cfg = picam2.create_preview_configuration(
-        main={"size": (320, 320), "format": "RGB888"}
-    )
-    picam2.configure(cfg)
-    picam2.start()
-
-def generate_frames():
-    """MJPEG generator for FastAPI video streaming."""
-    while True:
-        frame = picam2.capture_array()
-        ok, jpeg = cv2.imencode(".jpg", frame)
-        if not ok:
-            continue
-        yield (b"--frame\r\n"
-               b"Content-Type: image/jpeg\r\n\r\n" +
-               jpeg.tobytes() +
-               b"\r\n")
+    camera.start()
+
+
+# ----- ADAPTIVE QUALITY -----
+# (JPEG quality, scale, fps) rungs from best to cheapest; a viewer moves down
+# while its connection cannot drain parts in time and back up once it can.
+# STREAM_BEST / STREAM_WORST bound the rungs the server will use.
+LADDER = [(95, 1.0, 30), (80, 1.0, 30), (65, 1.0, 20), (55, 0.75, 15),
+          (45, 0.5, 10), (35, 0.5, 5)]
+BEST = int(os.environ.get("STREAM_BEST", 0))
+WORST = int(os.environ.get("STREAM_WORST", len(LADDER) - 1))
+
+BUSY_HIGH = 0.8     # part took > 80 % of its frame slot to send → step down
+BUSY_LOW = 0.3      # < 30 % for UP_AFTER seconds → step up
+UP_AFTER = 3.0
+HOLD = 0.5          # seconds to wait after a change before judging again
+
+
+class MjpegBroadcaster:
+    """Captures each frame once; viewers share one JPEG encode per setting.
+
+    Frames come from a FramePool filled by a CaptureService on the main
+    stream, so capture allocates nothing per frame.  Both start with the
+    first viewer and stop once there are none (or none has asked for a
+    frame in ``idle_after`` seconds), so an unwatched robot spends nothing
+    on them.  Parts are encoded on first request for each (quality, scale)
+    and cached for that frame, so all viewers on the same setting cost one
+    encode.  Viewers only ever get the newest frame: one still sending the
+    previous part simply skips the ones it missed, so there is never a
+    backlog.
+    """
+
+    def __init__(self, camera, idle_after=2.0):
+        self.camera = camera
+        self.idle_after = idle_after
+        self.pool = FramePool(camera.main_shape, consumers=("stream",))
+        self.cond = threading.Condition()
+        self.thread = None
+        self.frame = None       # newest pool Frame, held until the next; None while stopped
+        self.seq = 0
+        self.clients = 0
+        self.last_fetch = 0.0
+        self.encode_lock = threading.Lock()
+        self.cache_seq = -1
+        self.cache = {}         # (quality, scale) -> part, for cache_seq
+        self.encoded = 0
+        self.sent = 0
+
+    def _swap(self, frame):
+        # under encode_lock: nobody is encoding from the slot given back
+        with self.encode_lock, self.cond:
+            old, self.frame = self.frame, frame
+            if frame is not None:
+                self.seq += 1
+                self.cond.notify_all()
+        if old is not None:
+            self.pool.release(old)
+
+    def _run(self):
+        service = CaptureService(self.camera, self.pool, stream="main")
+        service.start()
+        try:
+            while True:
+                with self.cond:
+                    idle = time.monotonic() - self.last_fetch > self.idle_after
+                    if self.clients == 0 or idle:
+                        return
+                frame = self.pool.get("stream", timeout=0.5)
+                if frame is not None:
+                    self._swap(frame)
+        finally:
+            service.stop()
+            service.join()
+            self._swap(None)
+            # nor keep a frame pending that the next viewer would get stale
+            stale = self.pool.get("stream", timeout=0)
+            if stale is not None:
+                self.pool.release(stale)
+            with self.cond:
+                self.thread = None
+
+    def next_frame(self, last_seq, timeout=1.0):
+        """Wait for a frame newer than ``last_seq``; False on timeout."""
+        with self.cond:
+            self.last_fetch = time.monotonic()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            return self.cond.wait_for(lambda: self.frame is not None and self.seq != last_seq, timeout)
+
+    def encode(self, quality, scale):
+        """(seq, multipart chunk) of the newest frame at this setting,
+        encoded once per frame; the chunk is None if there is no frame."""
+        key = (quality, scale)
+        with self.encode_lock:
+            # the frame can't be swapped out (and its slot reused) while we hold the lock
+            seq, frame = self.seq, self.frame
+            if frame is None:
+                return seq, None
+            if seq > self.cache_seq:
+                self.cache_seq, self.cache = seq, {}
+            if key in self.cache:
+                return seq, self.cache[key]
+
+            frame = frame.array
+            if scale != 1.0:
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                return seq, None
+            part = (b"--frame\r\n"
+                    b"Content-Type: image/jpeg\r\n\r\n" +
+                    jpeg.tobytes() +
+                    b"\r\n")
+            self.encoded += 1
+            self.cache[key] = part
+            return seq, part
+
+    def stream(self, quality=None, scale=None, fps=None):
+        """MJPEG generator for one viewer.
+
+        Settings given here are pinned; the rest follow LADDER, driven by
+        how long each part takes to leave (the time this generator stays
+        suspended at ``yield`` is the send backpressure).
+        """
+        with self.cond:
+            self.clients += 1
+        try:
+            level, hold_until, calm_since = BEST, 0.0, None
+            seq = 0
+            last_sent = 0.0
+            while True:
+                q, s, f = LADDER[level]
+                q, s, f = quality or q, scale or s, fps or f
+
+                wait = last_sent + 1.0 / f - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                if not self.next_frame(seq):
+                    continue
+                seq, part = self.encode(q, s)
+                if part is None:
+                    continue
+
+                last_sent = time.monotonic()
+                yield part
+                self.sent += 1
+                now = time.monotonic()
+                busy = (now - last_sent) * f
+
+                # step the ladder on sustained back-pressure (or lack of it)
+                if now < hold_until:
+                    pass
+                elif busy > BUSY_HIGH:
+                    if level < WORST:
+                        level, hold_until = level + 1, now + HOLD
+                    calm_since = None
+                elif busy < BUSY_LOW:
+                    if calm_since is None:
+                        calm_since = now
+                    elif now - calm_since >= UP_AFTER and level > BEST:
+                        level, hold_until, calm_since = level - 1, now + HOLD, None
+                else:
+                    calm_since = None
+        finally:
+            with self.cond:
+                self.clients -= 1
+
+
+broadcaster = MjpegBroadcaster(camera)
+
+def generate_frames(quality=None, scale=None, fps=None):
+    """MJPEG generator for FastAPI video streaming (shared, adaptive)."""
+    return broadcaster.stream(quality, scale, fps)
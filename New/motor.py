@@ -1,4 +1,9 @@
 # motor_control.py
+import math
+import os
+import threading
+import time
+
 from brickpi3 import BrickPi3
 
 BP = BrickPi3()
@@ -7,26 +12,141 @@ C = BP.PORT_C
 D = BP.PORT_D
 DEFAULT_SPEED = 400
 
+# Every write below goes through _lock and records what C / D were last told,
+# whichever route or connection it came from: (left, right) dps, (0, 0)
+# after a stop, None when unknown.
+_lock = threading.Lock()
+written = None
+
+def _drive(left, right):
+    global written
+    with _lock:
+        BP.set_motor_dps(C, left)
+        BP.set_motor_dps(D, right)
+        written = (left, right)
+
 def forward(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(C, speed)
-    BP.set_motor_dps(D, speed)
+    _drive(speed, speed)
 
 def backward(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(C, -speed)
-    BP.set_motor_dps(D, -speed)
+    _drive(-speed, -speed)
 
 def rotate_clockwise(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(C, speed)
-    BP.set_motor_dps(D, -speed)
+    _drive(speed, -speed)
 
 def rotate_anticlockwise(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(C, -speed)
-    BP.set_motor_dps(D, speed)
+    _drive(-speed, speed)
 
 def stop_motors():
-    BP.set_motor_power(C, 0)
-    BP.set_motor_power(D, 0)
+    global written
+    with _lock:
+        BP.set_motor_power(C, 0)
+        BP.set_motor_power(D, 0)
+        written = (0, 0)
 
 def cleanup():
+    global written
     stop_motors()
-    BP.reset_all()
+    with _lock:
+        BP.reset_all()
+        written = None
+
+def set_speeds(left, right):
+    """Left (C) / right (D) wheel speeds in dps; 0, 0 brakes like stop_motors.
+
+    Skipped when the motors were last told exactly this, by any caller;
+    returns whether anything was written.
+    """
+    global written
+    with _lock:
+        if (left, right) == written:
+            return False
+        if left == 0 and right == 0:
+            BP.set_motor_power(C, 0)
+            BP.set_motor_power(D, 0)
+        else:
+            BP.set_motor_dps(C, left)
+            BP.set_motor_dps(D, right)
+        written = (left, right)
+        return True
+
+
+# ----- SETPOINT STREAM (WebSocket /motor/ws) -----
+DEADMAN = float(os.environ.get("MOTOR_DEADMAN", 0.5))   # s without a setpoint before we stop
+MAX_SPEED = 1000
+
+
+class SetpointChannel:
+    """One client's stream of (seq, left, right) setpoints.
+
+    Setpoints are applied in sequence order: one that arrives after a newer
+    one is acked but not applied.  The same setpoint repeated (the client
+    resends it as a heartbeat) costs no SPI write unless something else has
+    driven the motors since.  If no setpoint is applied for ``deadman``
+    seconds the motors are stopped until the next one; stale and rejected
+    messages do not count.
+    """
+
+    def __init__(self, deadman=DEADMAN):
+        self.deadman = deadman
+        self.last_seq = -1
+        self.last_applied = time.monotonic()
+        self.expired = False
+        self.received = 0
+        self.stale = 0
+        self.rejected = 0
+        self.writes = 0
+
+    def reject(self, msg, reason):
+        """Ack for a message that is not a setpoint; nothing is applied."""
+        self.rejected += 1
+        seq = msg.get("seq") if isinstance(msg, dict) else None
+        return {"ack": seq if isinstance(seq, int) else None, "applied": False, "error": reason}
+
+    def handle(self, msg):
+        """Apply one setpoint message; returns the ack to send back."""
+        received = time.monotonic()
+        self.received += 1
+        if not isinstance(msg, dict):
+            return self.reject(msg, "expected an object {seq, left, right}")
+        try:
+            seq, left, right = (float(msg[key]) for key in ("seq", "left", "right"))
+        except KeyError as e:
+            return self.reject(msg, f"missing {e.args[0]!r}")
+        except (TypeError, ValueError):
+            return self.reject(msg, "seq, left and right must be numbers")
+        if not all(math.isfinite(v) for v in (seq, left, right)) or seq != int(seq):
+            return self.reject(msg, "seq must be an integer, left and right finite")
+
+        seq = int(seq)
+        ack = {"ack": seq, "t": msg.get("t"), "applied": False}
+        if seq <= self.last_seq:
+            self.stale += 1
+            return ack
+
+        self.last_seq = seq
+        left = max(-MAX_SPEED, min(MAX_SPEED, int(left)))
+        right = max(-MAX_SPEED, min(MAX_SPEED, int(right)))
+        if set_speeds(left, right):
+            self.writes += 1
+        self.last_applied = time.monotonic()
+        self.expired = False
+        ack["applied"] = True
+        ack["motor_ms"] = round((time.monotonic() - received) * 1000, 3)
+        return ack
+
+    def due(self):
+        """Seconds until the deadman stops the motors (<= 0: overdue), or
+        None once it has."""
+        if self.expired:
+            return None
+        return self.last_applied + self.deadman - time.monotonic()
+
+    def expire(self):
+        """No setpoint applied for too long: stop, once, and wait for the next."""
+        if not self.expired:
+            stop_motors()
+            self.expired = True
+
+    def close(self):
+        stop_motors()
@@ -1,15 +1,22 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Query, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
+import numpy as np
 
-from motor import forward, backward, rotate_clockwise, rotate_anticlockwise, stop_motors
+from motor import forward, backward, rotate_clockwise, rotate_anticlockwise, stop_motors, SetpointChannel
 
 from cam import start_camera, generate_frames
-from ultrasonic import get_distance
+from ultrasonic import start_sampler, sampler
 
 app = FastAPI()
 
 start_camera()
+start_sampler()
 # ---------- INDIVIDUAL MOTOR ROUTES ----------
 
 @app.post("/motor/forward")
@@ -42,11 +49,56 @@ def stop_route():
     return {"status": "ok", "action": "stop"}
 
 
+# ---------- SETPOINT STREAM ----------
+
+@app.websocket("/motor/ws")
+async def motor_ws(ws: WebSocket):
+    """One persistent connection instead of a request per command.
+
+    The client sends {"seq", "left", "right", "t"} (dps, resent as a
+    heartbeat) and gets {"ack", "t", "applied", "motor_ms"} back once the
+    motors have it, or {"ack", "applied": False, "error"} for a message that
+    is not a setpoint.  No setpoint applied for longer than the deadman
+    stops the motors.
+    """
+    await ws.accept()
+    channel = SetpointChannel()
+    try:
+        while True:
+            # the deadman runs from the last applied setpoint: stale or
+            # rejected messages arriving in between do not hold it off
+            due = channel.due()
+            if due is not None and due <= 0:
+                channel.expire()
+                due = None
+            try:
+                message = await asyncio.wait_for(ws.receive(), due)
+            except asyncio.TimeoutError:
+                continue
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            try:
+                msg = json.loads(message.get("text") or message.get("bytes") or "")
+            except ValueError:
+                # answer and keep the connection: one garbled message is not a reason to drop
+                await ws.send_json(channel.reject(None, "not JSON"))
+                continue
+            # an SPI write is well under a millisecond: fine on the event loop
+            await ws.send_json(channel.handle(msg))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        channel.close()
+
+
 # ------------------ VIDEO FEED API ------------------
 
 @app.get("/video_feed")
-def video_feed():
-    return StreamingResponse(generate_frames(),
+def video_feed(quality: Optional[int] = Query(None, ge=10, le=100),
+               scale: Optional[float] = Query(None, gt=0.1, le=1.0),
+               fps: Optional[float] = Query(None, gt=0, le=30)):
+    # any of quality / scale / fps given here is pinned, the rest adapt
+    return StreamingResponse(generate_frames(quality, scale, fps),
         media_type="multipart/x-mixed-replace; boundary=frame"
     )
 
@@ -55,4 +107,29 @@ def video_feed():
 
 @app.get("/sensor")
 def sensor_route():
-    return {"distance_cm": get_distance()}
+    # answered from the sampler's cache: no SPI read per request
+    latest = sampler.latest()
+    if latest is None:
+        return {"distance_cm": None, "age_s": None, "errors": sampler.errors}
+    return latest
+
+
+@app.get("/sensor/history")
+def sensor_history_route(since_seq: Optional[int] = None, since: Optional[float] = None,
+                         window: Optional[float] = None, max_points: Optional[int] = None):
+    """Every cached sample after ``since_seq`` (or wall time ``since``, or
+    the last ``window`` seconds), as columns; pass the returned
+    ``last_seq`` back as ``since_seq``.  ``now`` is this robot's wall
+    clock, so clients can age samples without trusting their own."""
+    now = time.time()
+    if window is not None and since is None:
+        since = now - window
+    last_seq, seq, t, cm = sampler.history(since_seq, since, max_points)
+    return {
+        "now": round(now, 3),
+        "last_seq": last_seq,
+        "seq": seq.tolist(),
+        "time": np.round(t, 3).tolist(),
+        "distance_cm": cm.tolist(),
+        "errors": sampler.errors,
+    }
@@ -1,12 +1,114 @@
-from brickpi3 import BrickPi3
+import os
+import threading
+import time
+
+import numpy as np
+from brickpi3 import BrickPi3, SensorError
 
 BP = BrickPi3()
 PORT = BP.PORT_1
 
 BP.set_sensor_type(PORT, BP.SENSOR_TYPE.EV3_ULTRASONIC_CM)
 
+SAMPLE_HZ = float(os.environ.get("ULTRASONIC_HZ", 10))
+HISTORY = 3000          # samples kept (5 min at 10 Hz)
+
+
+class UltrasonicSampler:
+    """Reads the sensor on its own thread; requests only read the cache.
+
+    Samples go into a preallocated ring of (seq, wall time, cm) rows, so
+    any number of /sensor callers cost no SPI traffic at all.  Failed
+    reads are counted, not stored.
+    """
+
+    def __init__(self, rate=SAMPLE_HZ, history=HISTORY):
+        self.period = 1.0 / rate
+        self.samples = np.full((history, 3), np.nan)
+        self.count = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_read = None   # monotonic time of the newest sample
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=1)
+
+    def _run(self):
+        # fixed-rate deadlines on the monotonic clock, so the rate never drifts
+        next_t = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                cm = BP.get_sensor(PORT)
+            except (SensorError, IOError) as error:
+                self.errors += 1
+                self.last_error = str(error)
+            else:
+                self.samples[self.count % len(self.samples)] = (self.count + 1, time.time(), cm)
+                self.last_read = time.monotonic()
+                self.count += 1
+
+            next_t += self.period
+            delay = next_t - time.monotonic()
+            if delay < 0:
+                next_t = time.monotonic()   # overran: skip, don't burst
+            elif self.stop_event.wait(delay):
+                break
+
+    def latest(self):
+        """Newest reading as a dict, or None before the first good read."""
+        if self.count == 0:
+            return None
+        seq, t, cm = self.samples[(self.count - 1) % len(self.samples)].tolist()
+        return {"seq": int(seq), "time": t, "distance_cm": cm,
+                "age_s": time.monotonic() - self.last_read, "errors": self.errors}
+
+    def history(self, since_seq=None, since_time=None, max_points=None):
+        """Samples newer than ``since_seq`` (or wall time ``since_time``).
+
+        Returns (last seq, seq, time, cm): the newest seq at the time of
+        the call (the next ``since_seq``) and the columns in order.  With
+        ``max_points`` a long window is cut into max_points / 2 buckets
+        that each keep their lowest and highest reading, so spikes survive
+        downsampling.
+        """
+        count = self.count
+        size = len(self.samples)
+        first = max(count - size, 0) + 1                # oldest seq still held
+        start = first if since_seq is None else max(int(since_seq) + 1, first)
+        seqs = np.arange(start, count + 1)
+        rows = self.samples[(seqs - 1) % size]          # copy, writer keeps going
+        rows = rows[rows[:, 0] == seqs]                 # drop rows overwritten meanwhile
+        if since_time is not None:
+            rows = rows[rows[:, 1] > since_time]
+        if max_points and len(rows) > max_points:
+            rows = _minmax_downsample(rows, max(max_points // 2, 1))
+        return count, rows[:, 0].astype(int), rows[:, 1], rows[:, 2]
+
+
+def _minmax_downsample(rows, buckets):
+    """Keep the min and max distance of each bucket, in time order."""
+    keep = []
+    for chunk in np.array_split(np.arange(len(rows)), buckets):
+        lo = chunk[np.argmin(rows[chunk, 2])]
+        hi = chunk[np.argmax(rows[chunk, 2])]
+        keep.extend(sorted({lo, hi}))
+    return rows[keep]
+
+
+sampler = UltrasonicSampler()
+
+
+def start_sampler():
+    sampler.start()
+
+
 def get_distance():
-    try:
-        return BP.get_sensor(PORT)
-    except:
-        return None
+    """Latest cached distance in cm (None until the first good read)."""
+    latest = sampler.latest()
+    return None if latest is None else latest["distance_cm"]
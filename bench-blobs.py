@@ -0,0 +1,61 @@
+import time
+import cv2
+import numpy as np
+from vision import find_blobs
+
+# ----- SETTINGS -----
+SIZES = [(320, 320), (640, 480)]
+BLOB_COUNTS = [1, 20, 200]
+MIN_AREA = 300
+K = 8
+REPEATS = 200
+BATCHES = 5                 # best batch is reported, like timeit
+
+
+def synthetic_mask(w, h, n):
+    """Binary mask with n random discs, like a cluttered inspection frame."""
+    rng = np.random.default_rng(n)
+    mask = np.zeros((h, w), np.uint8)
+    for _ in range(n):
+        c = (int(rng.integers(0, w)), int(rng.integers(0, h)))
+        cv2.circle(mask, c, int(rng.integers(4, 25)), 255, -1)
+    return mask
+
+
+def single_target(mask):
+    """The detect_ring / camera_thread path: one target via findContours."""
+    cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if cnts:
+        c = max(cnts, key=cv2.contourArea)
+        if cv2.contourArea(c) > MIN_AREA:
+            M = cv2.moments(c)
+            (_, _), radius = cv2.minEnclosingCircle(c)
+            return M, radius
+    return None
+
+
+def timed(fn, mask):
+    out = fn(mask)
+    best = float("inf")
+    for _ in range(BATCHES):
+        t0 = time.perf_counter()
+        for _ in range(REPEATS):
+            fn(mask)
+        best = min(best, (time.perf_counter() - t0) / REPEATS * 1e6)
+    return best, out
+
+
+# find_blobs reports up to K targets, so it pays moments + boundingRect for
+# each of them where the single-target path pays for one; "vs single" is
+# that price, and k=1 shows the ranking itself costs next to nothing
+print(f"{'size':>9} {'blobs':>5} {'single target':>13} {'find_blobs':>11} {'vs single':>9} "
+      f"{'(k=1)':>7} {'(cc)':>7} {'found':>5}")
+for w, h in SIZES:
+    for n in BLOB_COUNTS:
+        mask = synthetic_mask(w, h, n)
+        single_us, _ = timed(single_target, mask)
+        multi_us, blobs = timed(lambda m: find_blobs(m, MIN_AREA, k=K), mask)
+        one_us, _ = timed(lambda m: find_blobs(m, MIN_AREA, k=1), mask)
+        cc_us, _ = timed(lambda m: find_blobs(m, MIN_AREA, k=K, method="cc"), mask)
+        print(f"{w:>4}x{h:<4} {n:>5} {single_us:>11.0f}us {multi_us:>9.0f}us "
+              f"{multi_us / single_us - 1:>+9.0%} {one_us:>5.0f}us {cc_us:>5.0f}us {len(blobs):>5}")
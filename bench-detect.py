@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from capture import yuv420_planes, yuv_half
+from stats import IntervalStats
+from vision import HsvLut, RoiTracker, find_blobs, ring_stages
+
+# ==========================================================
+#     DETECTION BENCHMARK (NO CAMERA, RECORDED OR SYNTHETIC)
+# ==========================================================
+# usage: python bench-detect.py [--recording clip.npy] [--out results/bench-detect.json]
+#                               [--compare old.json] [--frames 200] [--sensor 3280x2464]
+LOWER = np.array([35, 70, 60])
+UPPER = np.array([90, 255, 255])
+
+
+def synthetic_frames(w, h, n=30):
+    """Noisy BGR frames with a green ring moving across the view."""
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(n):
+        frame = rng.integers(0, 120, (h, w, 3), dtype=np.uint8)
+        cv2.circle(frame, (int(w * (0.2 + 0.6 * i / n)), h // 2), min(w, h) // 6, (40, 180, 60), -1)
+        frames.append(frame)
+    return frames
+
+
+def recorded_frames(path, w, h, n=30):
+    """First n frames of a main-stream (BGR) recording, scaled to w x h."""
+    from replay import ReplayCamera
+    cam = ReplayCamera(path)
+    count = min(n, len(cam))
+    return [cv2.resize(cam.capture_array(), (w, h)) for _ in range(count)]
+
+
+# ----- VARIANTS: name -> (prepare(frame) -> input, [(stage, fn(job))]) -----
+def ring_variant(blur_size, kernel_size, lut_bits):
+    stages = ring_stages(HsvLut(lut_bits), min_area=500, kernel_size=kernel_size, blur_size=blur_size)
+
+    def prepare(frame, job):
+        job.update(frame=frame.copy(), lower=LOWER, upper=UPPER)
+    return prepare, stages
+
+
+def roi_variant():
+    tracker = RoiTracker(LOWER, UPPER, min_area=300)
+
+    def prepare(frame, job):
+        job["frame"] = frame
+
+    def detect(job):
+        job["center"], _ = tracker.detect(job["frame"])
+    return prepare, [("detect", detect)]
+
+
+def yuv_variant():
+    tracker = RoiTracker(LOWER, UPPER, min_area=300 / 4, kernel_size=3,
+                         classifier=HsvLut(bits=6, space="yuv"))
+    out = {}
+
+    def prepare(frame, job):
+        job["raw"] = cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420)
+        job["size"] = frame.shape[1], frame.shape[0]
+
+    def planes(job):
+        w, h = job["size"]
+        if "buf" not in out:
+            out["buf"] = np.empty((h // 2, w // 2, 3), np.uint8)
+        job["yuv"] = yuv_half(*yuv420_planes(job["raw"], w, h), out=out["buf"])
+
+    def detect(job):
+        job["center"], _ = tracker.detect(job["yuv"])
+    return prepare, [("yuv_half", planes), ("detect", detect)]
+
+
+def blobs_variant():
+    kernel = np.ones((5, 5), np.uint8)
+
+    def prepare(frame, job):
+        job["frame"] = frame
+
+    def threshold(job):
+        hsv = cv2.cvtColor(job["frame"], cv2.COLOR_BGR2HSV)
+        job["mask"] = cv2.inRange(hsv, LOWER, UPPER)
+
+    def morphology(job):
+        mask = cv2.morphologyEx(job["mask"], cv2.MORPH_OPEN, kernel)
+        job["mask"] = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    def blobs(job):
+        job["blobs"] = find_blobs(job["mask"], 300, k=8)
+    return prepare, [("threshold", threshold), ("morphology", morphology), ("blobs", blobs)]
+
+
+VARIANTS = {
+    "detect_ring": lambda: ring_variant(11, 5, None),
+    "detect_ring/no-blur": lambda: ring_variant(None, 5, None),
+    "detect_ring/kernel3": lambda: ring_variant(11, 3, None),
+    "detect_ring/kernel7": lambda: ring_variant(11, 7, None),
+    "detect_ring/lut6": lambda: ring_variant(11, 5, 6),
+    "camera_thread/roi-bgr": roi_variant,
+    "camera_thread/lores-yuv": yuv_variant,
+    "find_blobs": blobs_variant,
+}
+
+
+def run(variant, frames, n):
+    prepare, stages = VARIANTS[variant]()
+    latency = {name: IntervalStats(n) for name, _ in stages}
+    latency["total"] = IntervalStats(n)
+
+    t_start = time.perf_counter()
+    for i in range(n):
+        job = {}
+        prepare(frames[i % len(frames)], job)
+        t0 = t = time.perf_counter()
+        for name, fn in stages:
+            fn(job)
+            now = time.perf_counter()
+            latency[name].add(now - t)
+            t = now
+        latency["total"].add(t - t0)
+    wall = time.perf_counter() - t_start
+
+    # second, shorter pass for peak memory (tracemalloc slows things down)
+    prepare, stages = VARIANTS[variant]()
+    tracemalloc.start()
+    for i in range(min(n, 20)):
+        job = {}
+        prepare(frames[i % len(frames)], job)
+        for _, fn in stages:
+            fn(job)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    total = latency["total"].percentiles(50)[0]
+    return {
+        "fps": 1.0 / total if total > 0 else 0.0,
+        "loop_fps": n / wall,
+        "stages_ms": {name: dict(zip(("p50", "p95", "p99"),
+                                     [round(v * 1000, 3) for v in s.percentiles(50, 95, 99)]))
+                      for name, s in latency.items()},
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every detection variant without a camera.")
+    parser.add_argument("--recording", help="main-stream recording from record-frames.py")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--sensor", default="3280x2464", help="full sensor resolution WxH")
+    parser.add_argument("--variants", nargs="*", default=list(VARIANTS))
+    parser.add_argument("--out", default=os.path.join("results", "bench-detect.json"))
+    parser.add_argument("--compare", help="earlier results file to diff fps against")
+    args = parser.parse_args()
+
+    sw, sh = (int(v) for v in args.sensor.lower().split("x"))
+    sizes = [(320, 320), (640, 480), (sw, sh)]
+
+    results = []
+    for w, h in sizes:
+        frames = recorded_frames(args.recording, w, h) if args.recording else synthetic_frames(w, h)
+        # full-resolution frames are slow, keep the run time sane
+        n = args.frames if w * h <= 640 * 480 else max(10, args.frames // 10)
+        for variant in args.variants:
+            r = run(variant, frames, n)
+            r.update(variant=variant, size=f"{w}x{h}")
+            results.append(r)
+            s = r["stages_ms"]["total"]
+            print(f"{r['size']:>10} {variant:<24} {r['fps']:8.1f} fps  "
+                  f"p50 {s['p50']:8.2f}  p95 {s['p95']:8.2f}  p99 {s['p99']:8.2f} ms  "
+                  f"peak {r['peak_kib']:9.1f} KiB")
+
+    report = {
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "source": args.recording or "synthetic",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {len(results)} results to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = {(r["variant"], r["size"]): r for r in json.load(f)["results"]}
+        print(f"\nfps vs {args.compare}:")
+        for r in results:
+            prev = old.get((r["variant"], r["size"]))
+            if prev and prev["fps"]:
+                print(f"{r['size']:>10} {r['variant']:<24} {prev['fps']:8.1f} -> {r['fps']:8.1f} "
+                      f"({r['fps'] / prev['fps'] - 1:+.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import time
+import tracemalloc
+import numpy as np
+from capture import FramePool, CaptureService, yuv420_planes, yuv_half
+
+# ----- SETTINGS -----
+W, H = 320, 320          # lores size used by the automove scripts
+FRAMES = 300
+
+
+class SyntheticCamera:
+    """Stands in for DualStreamCamera: one fixed I420 frame, no sensor."""
+
+    def __init__(self):
+        self.raw = np.random.default_rng(0).integers(0, 256, (H * 3 // 2, W), dtype=np.uint8)
+
+    def capture_array(self):
+        return self.raw.copy()          # what picam2.capture_array() costs
+
+    def capture_into(self, out, stream="lores"):
+        np.copyto(out, self.raw)
+        return time.monotonic()
+
+
+def count_new_buffers(fn):
+    """Run fn once per frame; return (frame-sized allocations, bytes) per frame.
+
+    numpy reports its data buffers to tracemalloc, so every block that is
+    at least a quarter frame big and shows up during a frame is a fresh
+    allocation, even if it is freed again before the frame ends.
+    """
+    big = W * H // 4
+    allocs, total = 0, 0
+    tracemalloc.start()
+    for _ in range(FRAMES):
+        before = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)])
+        keep = fn()
+        after = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)])
+        for stat in after.compare_to(before, "lineno"):
+            if stat.size_diff >= big:
+                allocs += stat.count_diff
+                total += stat.size_diff
+        del keep
+    tracemalloc.stop()
+    return allocs / FRAMES, total / FRAMES
+
+
+cam = SyntheticCamera()
+
+# before: capture_array() + yuv_half allocate a new frame every time
+def per_frame_alloc():
+    raw = cam.capture_array()
+    return raw, yuv_half(*yuv420_planes(raw, W, H))
+
+# after: capture service fills pool slots, detection reuses one output buffer
+pool = FramePool((H * 3 // 2, W), consumers=("detect",))
+service = CaptureService(cam, pool)
+service.start()
+out = np.empty((H // 2, W // 2, 3), np.uint8)
+
+def pooled():
+    raw = pool.get("detect")
+    yuv_half(*yuv420_planes(raw.array, W, H), out=out)
+    pool.release(raw)
+    return out
+
+for name, fn in [("capture_array", per_frame_alloc), ("frame pool", pooled)]:
+    n, size = count_new_buffers(fn)
+    t0 = time.perf_counter()
+    for _ in range(FRAMES):
+        fn()
+    fps = FRAMES / (time.perf_counter() - t0)
+    print(f"{name:>14}: {n:.2f} frame buffers/frame, {size / 1024:.1f} KiB/frame, {fps:.0f} fps")
+
+service.stop()
+print(f"pool: {len(pool.buffers)} slots, {pool.next_id} frames published, "
+      f"writer waited for a free slot {pool.writer_waits} times")
@@ -0,0 +1,54 @@
+import sys
+import time
+import cv2
+import numpy as np
+from vision import HsvLut
+
+# ----- SETTINGS -----
+# 320x320 is what every script captures at; 3280x2464 is the Pi camera v2
+# sensor (pass WxH on the command line for another sensor)
+SIZES = [(320, 320), (640, 480), (3280, 2464)]
+if len(sys.argv) > 1:
+    w, h = sys.argv[1].lower().split("x")
+    SIZES[-1] = (int(w), int(h))
+
+LOWER = np.array([35, 80, 60])
+UPPER = np.array([85, 255, 255])
+REPEATS = 30
+
+
+def synthetic_frame(w, h):
+    """Blurred noise with a few green rings, like the detect_ring input."""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    for i in range(4):
+        c = (int(w * (i + 1) / 5), h // 2)
+        cv2.circle(frame, c, max(8, min(w, h) // 10), (40, 180, 60), -1)
+    return cv2.GaussianBlur(frame, (11, 11), 0)
+
+
+def timed(fn):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(REPEATS):
+        out = fn()
+    return (time.perf_counter() - t0) / REPEATS * 1000, out
+
+
+print(f"{'size':>11} {'bits':>4} {'hsv+inRange':>12} {'lut':>9} {'speedup':>8} {'mismatch':>9} {'rebuild':>9}")
+for w, h in SIZES:
+    frame = synthetic_frame(w, h)
+    exact = HsvLut(None)
+    exact.update(LOWER, UPPER)
+    ref_ms, ref = timed(lambda: exact.mask(frame))
+
+    for bits in (5, 6):
+        lut = HsvLut(bits)
+        t0 = time.perf_counter()
+        lut.update(LOWER, UPPER)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        lut_ms, mask = timed(lambda: lut.mask(frame))
+        mismatch = np.count_nonzero(mask != ref) / ref.size
+        print(f"{w:>5}x{h:<5} {bits:>4} {ref_ms:>10.2f}ms {lut_ms:>7.2f}ms "
+              f"{ref_ms / lut_ms:>7.2f}x {mismatch:>8.4%} {build_ms:>7.1f}ms")
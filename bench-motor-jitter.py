@@ -0,0 +1,176 @@
+import threading
+import time
+import cv2
+import numpy as np
+from capture import FramePool, CaptureService, yuv420_planes, yuv_half
+from motors import MotorDriver
+from odometry import Odometry
+from stats import IntervalStats
+from vision import RoiTracker, HsvLut
+from worker import VisionWorker
+from scheduler import PeriodicScheduler
+
+# ----- SETTINGS -----
+W, H = 320, 320
+CAMERA_FPS = 30
+SECONDS = 10
+LOWER = np.array([35, 70, 60])
+UPPER = np.array([90, 255, 255])
+# (encoder poll Hz, its phase in s) against a 100 Hz motor loop at phase 0:
+# none, ticking together with it, and half a period between its ticks
+ODOMETRY_CASES = ((0, None), (100, 0.0), (100, 0.005))
+
+
+class SyntheticCamera:
+    """I420 frames of a green ring sweeping across the view, at camera rate."""
+
+    lores_size = (W, H)
+    lores_shape = (H * 3 // 2, W)
+
+    def __init__(self):
+        self.frames = []
+        for x in range(40, 280, 4):
+            bgr = np.full((H, W, 3), 90, np.uint8)
+            cv2.circle(bgr, (x, H // 2), 40, (40, 180, 60), -1)
+            self.frames.append(cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420))
+        self.n = 0
+        self.next_t = time.monotonic()
+
+    def capture_into(self, out, stream="lores"):
+        self.next_t += 1 / CAMERA_FPS
+        time.sleep(max(0.0, self.next_t - time.monotonic()))
+        np.copyto(out, self.frames[self.n % len(self.frames)])
+        self.n += 1
+        return time.monotonic()
+
+
+def motor_loop(stats, stop, read_detection):
+    """Same shape as motor_thread: read detection, PID maths, sleep 10 ms."""
+    last_error = 0
+    while not stop.is_set():
+        stats.tick()
+        cx = read_detection()
+        error = (cx or 160) - 160
+        rotation = np.clip(0.32 * error + 0.18 * (error - last_error), -320, 320)
+        last_error = error
+        time.sleep(0.01)
+
+
+def run_threaded():
+    cam = SyntheticCamera()
+    pool = FramePool(cam.lores_shape)
+    capture = CaptureService(cam, pool)
+    tracker = RoiTracker(LOWER, UPPER, min_area=300 / 4, kernel_size=3,
+                         classifier=HsvLut(bits=6, space="yuv"))
+    frame = np.empty((H // 2, W // 2, 3), np.uint8)
+    lock = threading.Lock()
+    state = {"cx": None}
+    stop = threading.Event()
+
+    def camera_thread():
+        while not stop.is_set():
+            raw = pool.get("detect", timeout=0.5)
+            if raw is None:
+                continue
+            yuv_half(*yuv420_planes(raw.array, W, H), out=frame)
+            pool.release(raw)
+            center, _ = tracker.detect(frame)
+            with lock:
+                state["cx"] = center[0] * 2 if center else None
+
+    def read():
+        with lock:
+            return state["cx"]
+
+    stats = IntervalStats()
+    capture.start()
+    threading.Thread(target=camera_thread, daemon=True).start()
+    threading.Thread(target=motor_loop, args=(stats, stop, read), daemon=True).start()
+    time.sleep(SECONDS)
+    stop.set()
+    capture.stop()
+    return stats
+
+
+def run_process():
+    worker = VisionWorker(SyntheticCamera(), LOWER, UPPER)
+    worker.start()
+    stop = threading.Event()
+
+    def read():
+        _, det = worker.latest()
+        return None if np.isnan(det.cx) else det.cx
+
+    stats = IntervalStats()
+    threading.Thread(target=motor_loop, args=(stats, stop, read), daemon=True).start()
+    time.sleep(SECONDS)
+    stop.set()
+    print(f"  (process published {worker.latest()[0]} detections)")
+    worker.stop()
+    return stats
+
+
+def run_scheduled():
+    worker = VisionWorker(SyntheticCamera(), LOWER, UPPER)
+    worker.start()
+    loop = PeriodicScheduler(0.01, name="motor loop")
+    last_error = 0
+
+    def tick():
+        nonlocal last_error
+        _, det = worker.latest()
+        error = (160 if np.isnan(det.cx) else det.cx) - 160
+        rotation = np.clip(0.32 * error + 0.18 * (error - last_error), -320, 320)
+        last_error = error
+
+    loop.start(tick)
+    time.sleep(SECONDS)
+    loop.stop()
+    worker.stop()
+    return loop
+
+
+def run_odometry(rate, phase=None):
+    """Motor loop writing both wheels every 10 ms through MotorDriver while
+    Odometry polls their encoders at ``rate`` Hz (0: not at all), ``phase``
+    s after the motor ticks.  Needs the BrickPi3, or PYTHONPATH=sim for the
+    simulated one."""
+    from brickpi3 import BrickPi3
+
+    BP = BrickPi3()
+    motors = MotorDriver(BP)
+    odometry = None
+    name = "motor loop, no odometry"
+    if rate:
+        odometry = Odometry(motors, left=((BP.PORT_C, 1),), right=((BP.PORT_D, 1),), rate=rate, phase=phase)
+        name = f"motor loop, odometry {rate} Hz at +{phase * 1000:.0f} ms"
+    loop = PeriodicScheduler(0.01, name=name, phase=0.0)
+    k = 0
+
+    def tick():
+        nonlocal k
+        k += 1
+        speed = 200 if k % 2 else 260     # a real change every tick: both writes go out
+        motors.set_dps(BP.PORT_C, speed)
+        motors.set_dps(BP.PORT_D, -speed)
+
+    if odometry:
+        odometry.start()
+    loop.start(tick)
+    time.sleep(SECONDS)
+    loop.stop()
+    if odometry:
+        odometry.stop()
+        print(f"  ({odometry.count} odometry samples)")
+    motors.stop(BP.PORT_C, BP.PORT_D)
+    return loop
+
+
+if __name__ == "__main__":
+    print(f"motor loop tick interval, 10 ms target, {CAMERA_FPS} fps synthetic camera")
+    print(f"  detection thread : {run_threaded().summary()}")
+    print(f"  vision process   : {run_process().summary()}")
+    print(f"  fixed-rate scheduler + vision process:\n{run_scheduled().summary()}")
+    print("motor writes vs encoder polling on the same bus:")
+    for rate, phase in ODOMETRY_CASES:
+        print(run_odometry(rate, phase).summary())
@@ -0,0 +1,84 @@
+import argparse
+import json
+import time
+
+import requests
+import websocket    # websocket-client
+
+from stats import IntervalStats
+
+# ==========================================================
+#     COMMAND-TO-MOTOR LATENCY: REST ROUTES VS /motor/ws
+# ==========================================================
+# usage (wheels off the ground, they turn slowly):
+#   python bench-motor-latency.py --url http://robot:8000
+#   python bench-motor-latency.py --url https://xxxx.ngrok-free.app -n 100
+#
+# Every round trip below ends with the server's reply, which it only sends
+# after the motor write returned, so it bounds command-to-motor from above.
+# The WebSocket acks also carry the server's own receive → written time.
+
+SPEEDS = (50, 60)           # alternated so every command is a real change
+
+
+def report(name, stats):
+    p50, p95, p99 = stats.percentiles(50, 95, 99)
+    print(f"{name:>22}  {p50 * 1000:8.1f}  {p95 * 1000:8.1f}  {p99 * 1000:8.1f}  (ms)")
+
+
+def rest(base, n, session=None):
+    """POST /motor/forward like the dashboard did (new connection every time),
+    or over one keep-alive ``session``."""
+    post = session.post if session else requests.post
+    stats = IntervalStats(size=n)
+    for i in range(n):
+        t0 = time.monotonic()
+        resp = post(f"{base}/motor/forward", params={"speed": SPEEDS[i % 2]}, timeout=5)
+        resp.raise_for_status()
+        stats.add(time.monotonic() - t0)
+    return stats
+
+
+def ws(base, n):
+    url = base.replace("http", "ws", 1) + "/motor/ws"
+    conn = websocket.create_connection(url, timeout=5)
+    stats, server = IntervalStats(size=n), IntervalStats(size=n)
+    try:
+        for i in range(n):
+            speed = SPEEDS[i % 2]
+            t0 = time.monotonic()
+            conn.send(json.dumps({"seq": i, "left": speed, "right": speed, "t": t0}))
+            ack = json.loads(conn.recv())
+            stats.add(time.monotonic() - t0)
+            if ack["ack"] != i or not ack["applied"]:
+                raise RuntimeError(f"unexpected ack {ack} for seq {i}")
+            server.add(ack["motor_ms"] / 1000)
+        conn.send(json.dumps({"seq": n, "left": 0, "right": 0, "t": time.monotonic()}))
+        conn.recv()
+    finally:
+        conn.close()
+    return stats, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command-to-motor round trips, REST vs WebSocket.")
+    parser.add_argument("--url", required=True, help="server base URL, e.g. http://robot:8000")
+    parser.add_argument("-n", type=int, default=200, help="commands per method")
+    args = parser.parse_args()
+    base = args.url.rstrip("/")
+
+    print(f"{args.n} commands each against {base}")
+    print(f"{'':>22}  {'p50':>8}  {'p95':>8}  {'p99':>8}")
+    try:
+        report("REST, new connection", rest(base, args.n))
+        with requests.Session() as session:
+            report("REST, keep-alive", rest(base, args.n, session))
+        stats, server = ws(base, args.n)
+        report("WebSocket setpoint", stats)
+        report("  of which on server", server)
+    finally:
+        requests.post(f"{base}/motor/stop", timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import time
+import cv2
+import numpy as np
+from pipeline import FramePipeline
+from vision import HsvLut, ring_stages, detect_ring
+
+# ----- SETTINGS -----
+SIZES = [(320, 320), (640, 480), (1280, 960)]
+WORKERS = [1, 2, 3, 4]
+FRAMES = 120
+LOWER = np.array([35, 80, 60])
+UPPER = np.array([85, 255, 255])
+
+
+def synthetic_frames(w, h, n=30):
+    """Noisy frames with a green ring moving across, like the camera feed."""
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(n):
+        frame = rng.integers(0, 120, (h, w, 3), dtype=np.uint8)
+        cv2.circle(frame, (int(w * (0.2 + 0.6 * i / n)), h // 2), min(w, h) // 6, (40, 180, 60), -1)
+        frames.append(frame)
+    return frames
+
+
+print(f"{os.cpu_count()} CPU(s)")
+for w, h in SIZES:
+    frames = synthetic_frames(w, h)
+    stages = ring_stages(HsvLut(None))
+
+    t0 = time.perf_counter()
+    for i in range(FRAMES):
+        detect_ring(frames[i % len(frames)].copy(), LOWER, UPPER, stages)
+    seq_fps = FRAMES / (time.perf_counter() - t0)
+    print(f"\n{w}x{h}  sequential detect_ring: {seq_fps:.0f} fps")
+
+    for n in WORKERS:
+        pipe = FramePipeline(ring_stages(HsvLut(None)), workers=n)
+        delivered, last_seq = 0, -1
+        t0 = time.perf_counter()
+        for i in range(FRAMES):
+            job = pipe.process(frames[i % len(frames)].copy(), lower=LOWER, upper=UPPER)
+            if job is not None:
+                assert job["seq"] > last_seq, "out of order"
+                last_seq = job["seq"]
+                delivered += 1
+        fps = delivered / (time.perf_counter() - t0)
+        pipe.close()
+        print(f"  pipeline, {n} worker(s): {fps:.0f} fps ({fps / seq_fps:.2f}x)")
+        if n == WORKERS[-1]:
+            print("\n".join("    " + line for line in pipe.report().splitlines()))
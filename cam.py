@@ -1,24 +1,29 @@
-from picamera2 import Picamera2
+from capture import CaptureService, DualStreamCamera, FramePool
 import cv2
 import time
 
-picam2 = Picamera2()
-max_resolution = picam2.sensor_resolution
-video_config = picam2.create_preview_configuration(
-    main={"size": max_resolution, "format": "RGB888"}
-)
-picam2.configure(video_config)
-picam2.start()
+# operator view: the high-resolution main stream of the shared capture
+# module, read from its frame pool like the MJPEG feed does
+cam = DualStreamCamera(lores_size=None)
+pool = FramePool(cam.main_shape, consumers=("display",))
+service = CaptureService(cam, pool, stream="main")
+cam.start()
+service.start()
 time.sleep(2)
 
-print(f"Streaming live at max resolution: {max_resolution}")
+print(f"Streaming live at {cam.main_size}")
 
 while True:
-    frame = picam2.capture_array()
-    cv2.imshow("IMG", frame)
+    frame = pool.get("display", timeout=1.0)
+    if frame is None:
+        continue
+    cv2.imshow("IMG", frame.array)
+    pool.release(frame)
 
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
+service.stop()
+service.join()
 cv2.destroyAllWindows()
-picam2.stop()
+cam.stop()
@@ -0,0 +1,241 @@
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+
+# ==========================================================
+#          DUAL-STREAM CAMERA (MAIN = VIEW, LORES = DETECT)
+# ==========================================================
+MAIN_SCALE = 3      # default main size, in multiples of the lores size
+
+
+class DualStreamCamera:
+    """Picamera2 with an RGB888 ``main`` stream and a small YUV420 ``lores`` one.
+
+    ``lores_size=None`` configures the main stream only.
+
+    Main is the sharp view for operators (the MJPEG feed, cam.py) and
+    defaults to ``MAIN_SCALE`` times the lores size, 960x960 over a 320x320
+    lores.  Detection reads the ``lores`` Y/U/V planes straight from the
+    ISP, so no RGB frame is ever converted for it.  The ISP scales lores
+    from main's crop, so the two must have the same aspect ratio or lores
+    comes out squeezed; a square main gives the central crop the scripts'
+    320x320 RGB888 stream had, which the radius thresholds were tuned on.
+    Scripts that never look at main pass ``main_size=lores_size`` so the
+    ISP does not fill a big buffer nobody reads.
+    """
+
+    def __init__(self, lores_size=(320, 320), main_size=None):
+        from picamera2 import Picamera2
+
+        self.picam2 = Picamera2()
+        if main_size is None:
+            w, h = lores_size or (320, 320)
+            main_size = (w * MAIN_SCALE, h * MAIN_SCALE)
+        if lores_size is not None and main_size[0] * lores_size[1] != main_size[1] * lores_size[0]:
+            raise ValueError(f"lores {lores_size} must have the aspect ratio of main {main_size}")
+
+        self.main_size = main_size
+        self.lores_size = lores_size
+        streams = {"main": {"format": "RGB888", "size": main_size}}
+        if lores_size is not None:
+            streams["lores"] = {"format": "YUV420", "size": lores_size}
+        self.picam2.configure(self.picam2.create_preview_configuration(**streams))
+
+    def start(self):
+        self.picam2.start()
+
+    def stop(self):
+        self.picam2.stop()
+
+    @property
+    def main_shape(self):
+        """Shape of one main RGB888 frame, (h, w, 3)."""
+        return (self.main_size[1], self.main_size[0], 3)
+
+    @property
+    def lores_shape(self):
+        """Shape of one raw lores I420 buffer, (h * 3 / 2, stride)."""
+        stride = self.picam2.camera_configuration()["lores"]["stride"]
+        return (self.lores_size[1] * 3 // 2, stride)
+
+    def capture_main(self):
+        return self.picam2.capture_array("main")
+
+    def capture_into(self, out, stream="lores"):
+        """Copy the next frame of ``stream`` into ``out`` without allocating.
+
+        Returns the sensor timestamp in seconds on the time.monotonic() clock.
+        """
+        from picamera2 import MappedArray
+
+        request = self.picam2.capture_request()
+        try:
+            with MappedArray(request, stream) as m:
+                np.copyto(out, m.array)
+            ts = request.get_metadata().get("SensorTimestamp")
+        finally:
+            request.release()
+        return ts / 1e9 if ts else time.monotonic()
+
+
+# ==========================================================
+#                     YUV420 HELPERS
+# ==========================================================
+def yuv420_planes(buf, w, h):
+    """Split a planar I420 buffer of shape (h * 3 / 2, stride) into views."""
+    stride = buf.shape[1]
+    y = buf[:h, :w]
+    chroma = buf[h:].reshape(-1)
+    u = chroma[:h // 2 * stride // 2].reshape(h // 2, stride // 2)[:, :w // 2]
+    v = chroma[h // 2 * stride // 2:h * stride // 2].reshape(h // 2, stride // 2)[:, :w // 2]
+    return y, u, v
+
+
+_scratch = threading.local()     # half-size Y, one per thread, for yuv_half(out=...)
+
+
+def yuv_half(y, u, v, out=None):
+    """Average Y down onto the chroma grid (2x2 INTER_AREA) and stack it
+    with U and V.
+
+    Averaging rather than taking every other pixel keeps sensor noise out
+    of the threshold.  Detection then runs on the (h/2, w/2) image, so
+    coordinates must be multiplied by 2 (and areas by 4) to get back to
+    lores pixels.  Pass ``out`` to reuse buffers instead of allocating
+    per frame.
+    """
+    h, w = u.shape
+    y_half = None
+    if out is not None:
+        y_half = getattr(_scratch, "y_half", None)
+        if y_half is None or y_half.shape != (h, w):
+            y_half = _scratch.y_half = np.empty((h, w), np.uint8)
+    y_half = cv2.resize(y, (w, h), dst=y_half, interpolation=cv2.INTER_AREA)
+    return cv2.merge([y_half, u, v], dst=out)
+
+
+# ==========================================================
+#          FRAME POOL (PREALLOCATED, SHARED, READ-ONLY)
+# ==========================================================
+Frame = namedtuple("Frame", "id timestamp array slot")
+
+
+class FramePool:
+    """Fixed set of preallocated frame buffers shared by named consumers.
+
+    This removes allocations, not copies: each frame is still copied once
+    out of the camera's request buffer (``capture_into``), because that
+    buffer has to go back to libcamera before the next frame.  After that
+    copy every consumer reads the same slot.
+
+    The writer fills a free slot and publishes it; every consumer then
+    holds a reference to it until it either takes it with ``get`` and
+    calls ``release``, or a newer frame replaces it before it was taken.
+    A slot is only handed back to the writer once every reference is
+    gone, so consumers can keep using a read-only view while the camera
+    moves on.  ``2 * consumers + 1`` slots are enough for one held and
+    one pending frame per consumer.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, consumers=("detect",), slots=None):
+        if slots is None:
+            slots = 2 * len(consumers) + 1
+
+        self.buffers = np.zeros((slots,) + tuple(shape), dtype)
+        self.views = []
+        for buf in self.buffers:
+            view = buf.view()
+            view.flags.writeable = False
+            self.views.append(view)
+
+        self.refs = [0] * slots          # -1 while the writer fills the slot
+        self.meta = [None] * slots       # (frame id, capture timestamp)
+        self.pending = {name: None for name in consumers}
+        self.cond = threading.Condition()
+        self.next_id = 0
+        self.writer_waits = 0
+
+    def acquire(self, timeout=None):
+        """Reserve a free slot for the writer; returns its index or None."""
+        with self.cond:
+            free = lambda: [i for i, r in enumerate(self.refs) if r == 0]
+            if not free():
+                self.writer_waits += 1
+                if not self.cond.wait_for(free, timeout):
+                    return None
+            # oldest free frame first, so recent ones stay readable longest
+            slot = min(free(), key=lambda i: -1 if self.meta[i] is None else self.meta[i][0])
+            self.refs[slot] = -1
+            return slot
+
+    def abort(self, slot):
+        """Give back a slot the writer reserved but could not fill."""
+        with self.cond:
+            self.refs[slot] = 0
+            self.cond.notify_all()
+
+    def publish(self, slot, timestamp):
+        """Hand a filled slot to every consumer; returns the new frame id."""
+        with self.cond:
+            frame_id = self.next_id
+            self.next_id += 1
+            self.meta[slot] = (frame_id, timestamp)
+            self.refs[slot] = 0
+
+            for name, old in self.pending.items():
+                if old is not None:
+                    self.refs[old] -= 1
+                self.pending[name] = slot
+                self.refs[slot] += 1
+
+            self.cond.notify_all()
+            return frame_id
+
+    def get(self, consumer, timeout=None):
+        """Take the newest frame ``consumer`` has not seen; None on timeout.
+
+        The caller owns the returned Frame until it calls ``release``.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.pending[consumer] is not None, timeout):
+                return None
+            slot = self.pending[consumer]
+            self.pending[consumer] = None
+            frame_id, ts = self.meta[slot]
+            return Frame(frame_id, ts, self.views[slot], slot)
+
+    def release(self, frame):
+        with self.cond:
+            self.refs[frame.slot] -= 1
+            if self.refs[frame.slot] == 0:
+                self.cond.notify_all()
+
+
+class CaptureService(threading.Thread):
+    """Background thread copying each camera frame once into a FramePool."""
+
+    def __init__(self, camera, pool, stream="lores"):
+        super().__init__(daemon=True)
+        self.camera = camera
+        self.pool = pool
+        self.stream = stream
+        self.running = True
+
+    def run(self):
+        while self.running:
+            slot = self.pool.acquire(timeout=0.5)
+            if slot is None:
+                continue
+            try:
+                ts = self.camera.capture_into(self.pool.buffers[slot], self.stream)
+            except Exception:
+                self.pool.abort(slot)
+                raise
+            self.pool.publish(slot, ts)
+
+    def stop(self):
+        self.running = False
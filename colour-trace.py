@@ -1,9 +1,10 @@
-from picamera2 import Picamera2
 import cv2
 import numpy as np
 from collections import deque
 import json
 import os
+from replay import ReplayCamera
+from vision import HsvLut, find_blobs
 
 # File to save HSV config
 CONFIG_FILE = "hsv_config.json"
@@ -19,11 +20,23 @@ else:
     }
 
 # Initialize camera
-picam2 = Picamera2()
+# REPLAY=clip.npy runs on a recording (REPLAY_REALTIME=1 paces it)
+if os.environ.get("REPLAY"):
+    picam2 = ReplayCamera(os.environ["REPLAY"], realtime=os.environ.get("REPLAY_REALTIME") == "1")
+else:
+    from picamera2 import Picamera2
+    picam2 = Picamera2()
 config = picam2.create_preview_configuration(main={"format": "RGB888", "size": (320, 320)})
 picam2.configure(config)
 picam2.start()
 
+# HSV -> mask classifier
+HSV_LUT_BITS = None  # 5 or 6 to use the lookup table (see bench-hsv-lut.py)
+classifier = HsvLut(bits=HSV_LUT_BITS)
+
+# Max markers reported per frame
+MAX_TARGETS = 8
+
 # Store tracked points
 pts = deque(maxlen=100)
 
@@ -44,9 +57,8 @@ cv2.createTrackbar("UV", "Trackbars", hsv_config["UV"], 255, nothing)
 while True:
     frame = picam2.capture_array()
 
-    # Blur + convert to HSV
+    # Blur
     blurred = cv2.GaussianBlur(frame, (11, 11), 0)
-    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
 
     # Get current positions of trackbars
     lh = cv2.getTrackbarPos("LH", "Trackbars")
@@ -60,31 +72,26 @@ while True:
     lower_green = np.array([lh, ls, lv])
     upper_green = np.array([uh, us, uv])
 
-    # Mask for green
-    mask = cv2.inRange(hsv, lower_green, upper_green)
+    # Mask for green (table is only rebuilt when a trackbar moves)
+    classifier.update(lower_green, upper_green)
+    mask = classifier.mask(blurred)
 
     # Noise removal
     mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
     mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
 
-    # Find contours
-    contours, _ = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Every marker in view, largest first (one findContours pass)
+    blobs = find_blobs(mask, min_area=500, k=MAX_TARGETS)
     center = None
 
-    if len(contours) > 0:
-        # Largest contour
-        c = max(contours, key=cv2.contourArea)
-
-        if cv2.contourArea(c) > 500:  # filter out noise
-            ((x, y), radius) = cv2.minEnclosingCircle(c)
-            M = cv2.moments(c)
-            if M["m00"] > 0:
-                center = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
+    for n, (area, (x, y, w, h), (bx, by)) in enumerate(blobs):
+        # Draw box + center, the largest one is traced
+        colour = (0, 255, 255) if n == 0 else (255, 255, 0)
+        cv2.rectangle(frame, (x, y), (x + w, y + h), colour, 2)
+        cv2.circle(frame, (int(bx), int(by)), 5, (0, 0, 255), -1)
 
-                if radius > 10:
-                    # Draw circle + center
-                    cv2.circle(frame, (int(x), int(y)), int(radius), (0, 255, 255), 2)
-                    cv2.circle(frame, center, 5, (0, 0, 255), -1)
+    if blobs:
+        center = tuple(int(v) for v in blobs[0].centroid)
 
     # Save center
     pts.appendleft(center)
@@ -4,7 +4,6 @@ import ttkbootstrap as tb
 from PIL import Image, ImageTk, ImageDraw, ImageFont
 import threading
 import time
-import random
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
@@ -12,10 +11,22 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import requests
 import io
 import cv2
+from motor_link import MotorLink
 
 CAMERA_FEED_URL = f"https://49ecf63d00b1.ngrok-free.app/video_feed"
-MOTOR_API_BASE = f"https://49ecf63d00b1.ngrok-free.app/manual"
+MOTOR_WS_URL = "wss://49ecf63d00b1.ngrok-free.app/motor/ws"
+MOTOR_SPEED = 400            # dps for the manual control buttons
+MOTOR_SETPOINTS = {
+    "forward": (MOTOR_SPEED, MOTOR_SPEED),
+    "backward": (-MOTOR_SPEED, -MOTOR_SPEED),
+    "left": (-MOTOR_SPEED, MOTOR_SPEED),
+    "right": (MOTOR_SPEED, -MOTOR_SPEED),
+    "stop": (0, 0),
+}
 ULTRASONIC_API = "https://49ecf63d00b1.ngrok-free.app/sensor"
+ULTRASONIC_HISTORY_API = "https://49ecf63d00b1.ngrok-free.app/sensor/history"
+ULTRASONIC_WINDOW = 60      # seconds of history on the graph
+ULTRASONIC_MAX_POINTS = 400  # server downsamples (min/max) beyond this
 
 class RatioFrame(ttk.Frame):
     def __init__(self, master, ratio, **kwargs):
@@ -71,10 +82,14 @@ class RobotDashboard:
         self.camera_update_lock = threading.Lock()
         self.battery_level = 100
         self.ultrasonic_job = None
-        self.x_data = list(range(20))
-        self.y_data = [random.randint(2, 20) for _ in range(20)]
+        self.ultra_samples = []      # (robot wall time, cm) from /sensor/history
+        self.ultra_last_seq = None
+        self.ultra_now = 0.0         # robot wall clock at the last reply
         self.figure = None
         self.canvas = None
+        # one persistent connection for motor commands; the robot stops by
+        # itself (server deadman) if this goes quiet
+        self.motor_link = MotorLink(MOTOR_WS_URL).start()
 
         self._create_header()
         self._create_main_content()
@@ -84,6 +99,7 @@ class RobotDashboard:
 
         self.root.after(100, self._show_robot_image)
         self.root.after(100, self._update_battery)
+        self.root.after(1000, self._update_motor_link)
         self.root.protocol("WM_DELETE_WINDOW", self._on_closing)
 
     def _color(self, name, default="#DDDDDD"):
@@ -98,15 +114,9 @@ class RobotDashboard:
         return default
 
     def send_motor_command(self, command):
-        url = f"{MOTOR_API_BASE}/{command}"
-        try:
-            resp = requests.get(url, timeout=3)
-            if resp.status_code != 200:
-                messagebox.showwarning("Motor API Warning",
-                                       f"Motor server returned status {resp.status_code} for '{command}'")
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Motor Control Error",
-                                 f"Could not send '{command}' to motor server.\n\n{e}")
+        # returns at once: the link thread sends it and keeps resending it
+        left, right = MOTOR_SETPOINTS[command]
+        self.motor_link.set(left, right)
 
     def _create_header(self):
         header = ttk.Frame(self.root, bootstyle="primary")
@@ -187,6 +197,8 @@ class RobotDashboard:
         self.start_time = time.strftime("%H:%M:%S")
         start_label = ttk.Label(prop_frame, text=f"Started: {self.start_time}", bootstyle="secondary")
         start_label.pack(pady=5)
+        self.motor_link_label = ttk.Label(prop_frame, text="Motors: connecting", bootstyle="secondary")
+        self.motor_link_label.pack(pady=5)
         prop_btn = ttk.Button(prop_frame, text="View Robot Specs", bootstyle="outline-primary")
         prop_btn.pack(pady=(10, 0), fill="x")
 
@@ -370,17 +382,16 @@ class RobotDashboard:
 
         self.fig.subplots_adjust(left=0.15, right=0.95, top=0.9, bottom=0.15)
         self.ax.set_title("Ultrasonic Sensor Distance", fontsize=14, color=self._color("primary", default="#000000"))
-        self.ax.set_xlabel("Time Step (s)", fontsize=10)
+        self.ax.set_xlabel("Seconds Ago", fontsize=10)
         self.ax.set_ylabel("Distance (cm)", fontsize=10)
         self.ax.set_ylim(0, 30)
         self.ax.grid(True, linestyle='--', alpha=0.7)
         self.ax.set_facecolor(self._color("secondary", default="#EEEEEE"))
 
-        self.x_data = list(range(20))
-        self.y_data = self.y_data if hasattr(self, "y_data") else [random.randint(2, 20) for _ in range(20)]
+        self.ax.set_xlim(-ULTRASONIC_WINDOW, 0)
         line_color = self._color("success", default="#00AA00")
-        self.line, = self.ax.plot(self.x_data, self.y_data,
-                                  marker="o", markersize=5,
+        self.line, = self.ax.plot([], [],
+                                  marker="o", markersize=3,
                                   color=line_color,
                                   linewidth=2)
 
@@ -408,28 +419,35 @@ class RobotDashboard:
     def _update_ultrasonic(self):
         if self.showing not in ["ultrasonic", "split_view"]:
             return
+        # one request brings every sample since the last one we have
+        # the window and the ages are on the robot's clock (its "now"), so
+        # skew between the robot and this machine does not matter
+        if self.ultra_last_seq is None:
+            params = {"window": ULTRASONIC_WINDOW, "max_points": ULTRASONIC_MAX_POINTS}
+        else:
+            params = {"since_seq": self.ultra_last_seq, "max_points": ULTRASONIC_MAX_POINTS}
+        offline = False
         try:
-            resp = requests.get(ULTRASONIC_API, timeout=1.0)
-            if resp.status_code == 200:
-                data = resp.json()
-                value = data.get("distance_cm", float(data.get("distance", random.randint(2, 20))))
-            else:
-                value = random.randint(2, 20)
-        except Exception:
-            value = random.randint(2, 20)
-
-        self.y_data.pop(0)
-        try:
-            numeric_val = max(0.0, min(500.0, float(value)))
-        except Exception:
-            numeric_val = float(random.randint(2, 20))
-        self.y_data.append(numeric_val)
+            resp = requests.get(ULTRASONIC_HISTORY_API, params=params, timeout=1.0)
+            resp.raise_for_status()
+            data = resp.json()
+            self.ultra_samples.extend(zip(data["time"], data["distance_cm"]))
+            self.ultra_last_seq = data["last_seq"]
+            self.ultra_now = data["now"]
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            offline = True
+
+        now = self.ultra_now
+        self.ultra_samples = [(t, cm) for t, cm in self.ultra_samples if now - t <= ULTRASONIC_WINDOW]
 
         try:
-            self.line.set_ydata(self.y_data)
-            y_min = max(0, int(min(self.y_data) - 2))
-            y_max = max(30, int(max(self.y_data) + 2))
-            self.ax.set_ylim(y_min, y_max)
+            xs = [t - now for t, _ in self.ultra_samples]
+            ys = [max(0.0, min(500.0, cm)) for _, cm in self.ultra_samples]
+            self.line.set_data(xs, ys)
+            if ys:
+                self.ax.set_ylim(max(0, int(min(ys) - 2)), max(30, int(max(ys) + 2)))
+            self.ax.set_title("Ultrasonic Sensor Distance" + (" (offline)" if offline else ""),
+                              fontsize=14, color=self._color("primary", default="#000000"))
             self.canvas.draw_idle()
         except Exception:
             pass
@@ -549,8 +567,15 @@ class RobotDashboard:
             pass
         self.root.after(1000, self._update_battery)
 
+    def _update_motor_link(self):
+        link = self.motor_link
+        self.motor_link_label.configure(text=f"Motors: {link.summary()}",
+                                        bootstyle="secondary" if link.connected else "danger")
+        self.root.after(1000, self._update_motor_link)
+
     def _on_closing(self):
         print("Stopping all threads and exiting...")
+        self.motor_link.close()
         self._stop_camera()
         self._stop_ultrasonic()
         try:
@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import os
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from offload import pack_frame, pack_result, unpack_frame, unpack_result
+from stats import IntervalStats
+from vision import HsvLut, detect_ring_batch
+
+# ==========================================================
+#     BATCHED DETECTION SERVER (MANY ROBOTS, ONE WORKSTATION)
+# ==========================================================
+# usage: python detect-server.py [--port 8765] [--batch-size 16] [--batch-wait 0.004]
+#   load test without robots or network:
+#        python detect-server.py --simulate 8
+#   end-to-end check of the server over localhost WebSockets:
+#        python detect-server.py --loopback 4
+#
+# Robots run fastapi.py against ws://<this host>:8765 (protocol in offload.py).
+# Each connection queues at most PER_ROBOT frames (a newer one pushes out its
+# oldest); the batcher takes frames from the robots in turn, waits at most
+# BATCH_WAIT for the batch to fill up to BATCH_SIZE, then decodes and detects
+# the whole batch in one worker job and sends each result back on the
+# connection its frame came from.
+BATCH_SIZE = int(os.environ.get("DETECT_BATCH_SIZE", 16))
+BATCH_WAIT = float(os.environ.get("DETECT_BATCH_WAIT", 0.004))  # s
+WORKERS = int(os.environ.get("DETECT_WORKERS", 2))    # batches in progress at once
+PER_ROBOT = int(os.environ.get("DETECT_PER_ROBOT", 4))  # above fastapi.py's 3 in flight
+LOWER = np.array([35, 70, 60])
+UPPER = np.array([90, 255, 255])
+STATS_EVERY = 5             # s
+
+
+class Robot:
+    """One connection: where its results go and how it is being served."""
+
+    def __init__(self, name, send):
+        self.name = name
+        self.send = send        # coroutine function taking the result bytes
+        self.frames = 0
+        self.answered = 0
+        self.dropped = 0        # messages that were not a frame
+        self.pending = deque()  # frames waiting for a batch, oldest first
+        self.overflow = 0       # frames pushed out of ``pending`` by newer ones
+        self.latency = IntervalStats(size=1000)    # frame received → result sent
+        self.queued = IntervalStats(size=1000)     # frame received → batch started
+        self.since = time.monotonic()
+
+    def summary(self, now):
+        fps = self.answered / (now - self.since)
+        lat50, lat95 = self.latency.percentiles(50, 95)
+        (q50,) = self.queued.percentiles(50)
+        self.answered, self.since = 0, now
+        dropped = f", {self.dropped} dropped" if self.dropped else ""
+        dropped += f", {self.overflow} overflowed" if self.overflow else ""
+        return (f"{self.name:>21}  {fps:5.1f} fps  server p50 {lat50 * 1000:5.1f} ms  "
+                f"p95 {lat95 * 1000:5.1f} ms  (queued p50 {q50 * 1000:4.1f} ms{dropped})")
+
+
+class BatchDetector:
+    """Groups frames from all robots into micro-batches for detection.
+
+    A batch starts as soon as a frame is waiting and a worker is free; it
+    takes whatever else is queued and waits up to ``batch_wait`` for more,
+    never beyond ``batch_size``.  While all ``workers`` are busy the queues
+    grow, so batches get larger exactly when the load is high.
+
+    Each robot has its own queue of at most ``per_robot`` frames: a frame
+    arriving at a full one pushes out that robot's oldest, so a robot
+    sending faster than it is served only delays itself.  Batches are
+    filled from the robots in turn, oldest frame of each first.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT, workers=WORKERS,
+                 per_robot=PER_ROBOT):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.per_robot = per_robot
+        self.turns = deque()    # robots with frames pending, in serving order
+        self.ready = asyncio.Event()    # set while ``turns`` is not empty
+        self.executor = ThreadPoolExecutor(workers)
+        self.free = asyncio.Semaphore(workers)
+        self.classifier = HsvLut(bits=None)
+        self.classifier.update(LOWER, UPPER)
+        self.robots = set()
+        self.tasks = set()      # batches in progress, referenced until done
+        self.batches = IntervalStats(size=1000)     # batch sizes
+
+    async def submit(self, robot, data):
+        """Queue one message from ``robot``.  One that is not a frame is
+        dropped here, so it costs that robot a frame and nobody else."""
+        received = time.monotonic()
+        try:
+            frame_id, ts, jpeg = unpack_frame(data)
+        except (struct.error, TypeError) as e:
+            robot.dropped += 1
+            if robot.dropped == 1:
+                print(f"{robot.name}: dropping malformed message ({e})")
+            return
+        robot.frames += 1
+        if len(robot.pending) >= self.per_robot:
+            robot.pending.popleft()
+            robot.overflow += 1
+        robot.pending.append((robot, frame_id, ts, jpeg, received))
+        if len(robot.pending) == 1:
+            self.turns.append(robot)
+        self.ready.set()
+
+    def take(self, n):
+        """Up to ``n`` queued frames, one robot at a time in turn."""
+        batch = []
+        while self.turns and len(batch) < n:
+            robot = self.turns.popleft()
+            if not robot.pending:
+                continue        # disconnected, its frames were thrown away
+            batch.append(robot.pending.popleft())
+            if robot.pending:
+                self.turns.append(robot)
+        if not self.turns:
+            self.ready.clear()
+        return batch
+
+    def queued(self):
+        return sum(len(robot.pending) for robot in self.turns)
+
+    def detect(self, jpegs):
+        frames = [cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR) for jpeg in jpegs]
+        ok = [i for i, frame in enumerate(frames) if frame is not None]
+        found = detect_ring_batch([frames[i] for i in ok], self.classifier)
+        targets = [None] * len(frames)
+        for i, target in zip(ok, found):
+            targets[i] = target
+        return targets
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.free.acquire()
+            await self.ready.wait()
+            batch = self.take(self.batch_size)
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                if self.turns:
+                    batch += self.take(self.batch_size - len(batch))
+                    continue
+                wait = deadline - loop.time()
+                if wait <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self.ready.wait(), wait)
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._process(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"batch failed, its frames go unanswered: {task.exception()!r}")
+
+    async def _process(self, batch):
+        try:
+            started = time.monotonic()
+            targets = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.detect, [jpeg for _, _, _, jpeg, _ in batch])
+            self.batches.add(len(batch))
+        finally:
+            self.free.release()
+
+        sends = []
+        for (robot, frame_id, ts, _, received), target in zip(batch, targets):
+            now = time.monotonic()
+            robot.queued.add(started - received)
+            robot.latency.add(now - received)
+            robot.answered += 1
+            sends.append(robot.send(pack_result(frame_id, ts, target, (now - received) * 1000)))
+        # a robot that has gone away must not hold up the others
+        await asyncio.gather(*sends, return_exceptions=True)
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(STATS_EVERY)
+            now = time.monotonic()
+            n = min(self.batches.count, len(self.batches.samples))
+            mean = self.batches.samples[:n].mean() if n else 0.0
+            print(f"{len(self.robots)} robots, batch size mean {mean:.1f} (max {self.batch_size}), "
+                  f"queued {self.queued()}")
+            for robot in sorted(self.robots, key=lambda r: r.name):
+                print(robot.summary(now))
+
+
+async def serve(detector, host, port, until=None):
+    """Serve robots forever, or only until the coroutine ``until`` is done
+    (its result is returned)."""
+    import websockets
+
+    async def handle(ws, path=None):
+        host, port = ws.remote_address[:2]
+        robot = Robot(f"{host}:{port}", ws.send)
+        detector.robots.add(robot)
+        print(f"robot connected: {robot.name}")
+        try:
+            async for message in ws:
+                await detector.submit(robot, message)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            detector.robots.discard(robot)
+            robot.pending.clear()
+            dropped = f" ({robot.dropped} malformed messages dropped)" if robot.dropped else ""
+            print(f"robot disconnected: {robot.name}{dropped}")
+
+    async with websockets.serve(handle, host, port, max_size=None):
+        print(f"detection server on ws://{host}:{port}  batch size {detector.batch_size}, "
+              f"wait {detector.batch_wait * 1000:.1f} ms")
+        if until is None:
+            await asyncio.gather(detector.run(), detector.report())
+        background = [asyncio.create_task(detector.run()), asyncio.create_task(detector.report())]
+        try:
+            return await until
+        finally:
+            for task in background:
+                task.cancel()
+
+
+# ----- LOAD TEST (NO NETWORK) -----
+def synthetic_jpegs(w=320, h=320, n=30):
+    """JPEGs of a green ring moving across a noisy view, like fastapi.py sends."""
+    rng = np.random.default_rng(0)
+    jpegs = []
+    for i in range(n):
+        frame = rng.integers(0, 120, (h, w, 3), dtype=np.uint8)
+        cv2.circle(frame, (int(w * (0.2 + 0.6 * i / n)), h // 2), min(w, h) // 6, (40, 180, 60), -1)
+        jpegs.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes())
+    return jpegs
+
+
+async def simulate(detector, robots, fps, in_flight):
+    """``robots`` fake robots, each sending at up to ``fps`` with ``in_flight``
+    frames outstanding, straight into the batcher."""
+    jpegs = synthetic_jpegs()
+
+    async def robot(i):
+        slots = asyncio.Semaphore(in_flight)
+
+        async def receive(data):
+            unpack_result(data)
+            slots.release()
+
+        r = Robot(f"sim-{i:02d}", receive)
+        detector.robots.add(r)
+        frame_id = 0
+        while True:
+            await slots.acquire()
+            await detector.submit(r, pack_frame(frame_id, time.monotonic(), jpegs[frame_id % len(jpegs)]))
+            frame_id += 1
+            await asyncio.sleep(1 / fps)
+
+    print(f"{robots} simulated robots at up to {fps} fps, {in_flight} frames in flight each; "
+          f"batch size {detector.batch_size}, wait {detector.batch_wait * 1000:.1f} ms")
+    await asyncio.gather(detector.run(), detector.report(), *(robot(i) for i in range(robots)))
+
+
+async def loopback(detector, robots, frames, port, in_flight=3):
+    """Serve on localhost and send ``frames`` frames from each of ``robots``
+    websockets clients with ``in_flight`` outstanding, like fastapi.py; the
+    first one also sends malformed messages between its frames.  One more
+    client floods: all its frames at once, without waiting.  Raises unless
+    every well-behaved client got every frame answered."""
+    import websockets
+    jpegs = synthetic_jpegs()
+    url = f"ws://127.0.0.1:{port}"
+
+    async def robot(i):
+        slots = asyncio.Semaphore(in_flight)
+        answered, found = set(), 0
+        sent, rtt = {}, IntervalStats(size=frames)
+        async with websockets.connect(url, max_size=None) as ws:
+
+            async def receiver():
+                nonlocal found
+                while len(answered) < frames:
+                    frame_id, _, target, _ = unpack_result(await asyncio.wait_for(ws.recv(), 5))
+                    rtt.add(time.monotonic() - sent.pop(frame_id))
+                    answered.add(frame_id)
+                    found += target is not None
+                    slots.release()
+
+            receiving = asyncio.create_task(receiver())
+            for frame_id in range(frames):
+                await slots.acquire()
+                if i == 0:
+                    await ws.send(b"\x00\x01")        # shorter than the header
+                    await ws.send("not a frame")
+                sent[frame_id] = time.monotonic()
+                await ws.send(pack_frame(frame_id, sent[frame_id], jpegs[frame_id % len(jpegs)]))
+            await receiving
+        p50, p95 = rtt.percentiles(50, 95)
+        return (f"client {i}: {len(answered)}/{frames} frames answered, ring found in {found}, "
+                f"round trip p50 {p50 * 1000:.1f} ms  p95 {p95 * 1000:.1f} ms")
+
+    async def flood():
+        answered = 0
+        async with websockets.connect(url, max_size=None) as ws:
+            for frame_id in range(frames * 4):
+                await ws.send(pack_frame(frame_id, time.monotonic(), jpegs[frame_id % len(jpegs)]))
+            try:
+                while True:
+                    unpack_result(await asyncio.wait_for(ws.recv(), 1))
+                    answered += 1
+            except asyncio.TimeoutError:
+                pass
+        return (f"flood: {answered}/{frames * 4} frames answered, "
+                f"at most {detector.per_robot} queued at a time")
+
+    async def clients():
+        return await asyncio.gather(flood(), *(robot(i) for i in range(robots)))
+
+    # clients() only starts once serve() awaits it, by then it is listening
+    for line in await serve(detector, "127.0.0.1", port, until=clients()):
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched ring detection for many offloading robots.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--batch-wait", type=float, default=BATCH_WAIT, help="s to wait for a batch to fill")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="batches detected at once")
+    parser.add_argument("--per-robot", type=int, default=PER_ROBOT, help="frames queued per robot")
+    parser.add_argument("--simulate", type=int, metavar="ROBOTS", help="in-process load test instead of serving")
+    parser.add_argument("--fps", type=float, default=30, help="camera rate of the simulated robots")
+    parser.add_argument("--in-flight", type=int, default=3, help="frames outstanding per simulated robot")
+    parser.add_argument("--loopback", type=int, metavar="ROBOTS", help="serve on localhost against test clients, then exit")
+    parser.add_argument("--frames", type=int, default=30, help="frames per loopback client")
+    args = parser.parse_args()
+
+    detector = BatchDetector(args.batch_size, args.batch_wait, args.workers, args.per_robot)
+    try:
+        if args.simulate:
+            asyncio.run(simulate(detector, args.simulate, args.fps, args.in_flight))
+        elif args.loopback:
+            asyncio.run(loopback(detector, args.loopback, args.frames, args.port, args.in_flight))
+        else:
+            asyncio.run(serve(detector, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detector.executor.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
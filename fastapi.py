@@ -1,29 +1,98 @@
-import cv2, asyncio, websockets, base64
+import asyncio
+import os
+import time
+
+import cv2
+import websockets
 from picamera2 import Picamera2
 
+from offload import pack_frame, unpack_result
+from stats import IntervalStats
+
+# ----- SETTINGS -----
+URI = os.environ.get("OFFLOAD_URI", "ws://192.168.0.109:8765")
+IN_FLIGHT = int(os.environ.get("OFFLOAD_IN_FLIGHT", 3))    # frames sent, not yet answered
+JPEG_QUALITY = 80
+RESULT_TIMEOUT = 1.0        # s before an unanswered frame gives its slot back
+STATS_EVERY = 5             # s
+
+
+def capture(picam2):
+    """Next frame and its sensor timestamp (s, time.monotonic() clock)."""
+    request = picam2.capture_request()
+    try:
+        frame = request.make_array("main")
+        ts = request.get_metadata().get("SensorTimestamp")
+    finally:
+        request.release()
+    return frame, (ts / 1e9 if ts else time.monotonic())
 
 
 async def send_frames():
-    uri = "ws://192.168.0.109:8765"
-    
     # ----- CAMERA SETUP -----
     picam2 = Picamera2()
     config = picam2.create_preview_configuration(main={"format": "RGB888", "size": (320, 320)})
     picam2.configure(config)
     picam2.start()
 
-    async with websockets.connect(uri) as ws:
-        while True:
-            frame = picam2.capture_array()
-            
-            # Encode frame as JPEG -> base64
-            _, buf = cv2.imencode(".jpg", frame)
-            b64 = base64.b64encode(buf).decode() # for websockets to be able to send text
-            await ws.send(b64)
-                    
-                    
-            # Receive coords back
-            coords = await ws.recv()
-            print("Received Corrds: ", coords)
+    # Up to IN_FLIGHT frames are out at once: the next frame is captured and
+    # encoded while earlier ones are still on the wire or being detected, so
+    # throughput is no longer one round trip per frame.  Replies are matched
+    # to frames by id.
+    slots = asyncio.Semaphore(IN_FLIGHT)
+    pending = {}                # frame id -> time sent
+    latency = IntervalStats()   # capture → coordinates back
+    newest = -1
+
+    async with websockets.connect(URI, max_size=None) as ws:
+
+        async def sender():
+            frame_id = 0
+            while True:
+                await slots.acquire()
+                frame, ts = await asyncio.to_thread(capture, picam2)
+                ok, buf = await asyncio.to_thread(
+                    cv2.imencode, ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+                if not ok:
+                    slots.release()
+                    continue
+                pending[frame_id] = time.monotonic()
+                await ws.send(pack_frame(frame_id, ts, buf))
+                frame_id += 1
+
+        async def receiver():
+            nonlocal newest
+            answered, last_report = 0, time.monotonic()
+            while True:
+                try:
+                    data = await asyncio.wait_for(ws.recv(), RESULT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    data = None
+
+                now = time.monotonic()
+                if data is not None:
+                    frame_id, ts, coords, server_ms = unpack_result(data)
+                    if pending.pop(frame_id, None) is not None:
+                        slots.release()
+                        answered += 1
+                        latency.add(now - ts)
+                        # an older frame answered late must not overwrite a newer one
+                        if frame_id > newest:
+                            newest = frame_id
+                            print(f"Frame {frame_id}: {coords}")
+
+                # frames the server dropped give their slot back
+                for frame_id, sent in list(pending.items()):
+                    if now - sent > RESULT_TIMEOUT:
+                        del pending[frame_id]
+                        slots.release()
+
+                if now - last_report >= STATS_EVERY:
+                    p50, p95 = latency.percentiles(50, 95)
+                    print(f"{answered / (now - last_report):.1f} fps  capture → coords "
+                          f"p50 {p50 * 1000:.1f} ms  p95 {p95 * 1000:.1f} ms  in flight {len(pending)}")
+                    answered, last_report = 0, now
+
+        await asyncio.gather(sender(), receiver())
 
 asyncio.run(send_frames())
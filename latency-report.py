@@ -0,0 +1,42 @@
+import argparse
+import numpy as np
+from latency import HOPS, read_trace
+
+# ==========================================================
+#        GLASS-TO-MOTOR LATENCY REPORT (FROM A TRACE FILE)
+# ==========================================================
+# usage: python latency-report.py trace.bin [--skip 30]
+#   (record one with LATENCY_TRACE=trace.bin python track-automove.py)
+
+def main():
+    parser = argparse.ArgumentParser(description="p50/p95/p99 per hop of a glass-to-motor trace.")
+    parser.add_argument("trace")
+    parser.add_argument("--skip", type=int, default=30, help="frames to drop at the start (warm-up)")
+    args = parser.parse_args()
+
+    columns, rows = read_trace(args.trace)
+    rows = rows[args.skip:]
+    if len(rows) == 0:
+        print("No frames in trace.")
+        return
+    col = {name: i for i, name in enumerate(columns)}
+
+    span = rows[-1, col["motor"]] - rows[0, col["capture"]]
+    print(f"{len(rows)} frames over {span:.1f} s "
+          f"({len(rows) / span if span > 0 else 0:.1f} frames reached the motors per s)")
+    print(f"{'hop':>10}  {'p50':>8}  {'p95':>8}  {'p99':>8}  {'max':>8}  {'share':>6}  (ms)")
+
+    total_p50 = np.percentile(rows[:, col["motor"]] - rows[:, col["capture"]], 50)
+    for hop, (a, b) in HOPS.items():
+        dt = (rows[:, col[b]] - rows[:, col[a]]) * 1000
+        p50, p95, p99 = np.percentile(dt, [50, 95, 99])
+        share = "" if hop == "total" else f"{p50 / (total_p50 * 1000):6.0%}"
+        print(f"{hop:>10}  {p50:8.2f}  {p95:8.2f}  {p99:8.2f}  {dt.max():8.2f}  {share:>6}")
+
+    frame_ids = rows[:, col["frame_id"]]
+    skipped = int(frame_ids[-1] - frame_ids[0] + 1 - len(np.unique(frame_ids)))
+    print(f"\n{skipped} captured frames never reached the motors (dropped or superseded)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import json
+
+import numpy as np
+
+
+# ==========================================================
+#              LATENCY HISTOGRAM (LOG-SPACED BINS)
+# ==========================================================
+class LatencyHistogram:
+    """Counts durations in log-spaced bins from ``lo`` to ``hi`` seconds.
+
+    Memory is fixed however long the robot runs; percentiles come back as
+    the upper edge of the bin they fall in (48 bins per decade, so about
+    5 % resolution).
+    """
+
+    def __init__(self, lo=1e-5, hi=10.0, bins_per_decade=48):
+        decades = np.log10(hi / lo)
+        self.edges = np.logspace(np.log10(lo), np.log10(hi), int(decades * bins_per_decade) + 1)
+        # counts[0] is below lo, counts[-1] above hi
+        self.counts = np.zeros(len(self.edges) + 1, np.int64)
+        self.total = 0
+        self.worst = 0.0
+
+    def add(self, value):
+        self.counts[np.searchsorted(self.edges, value)] += 1
+        self.total += 1
+        if value > self.worst:
+            self.worst = value
+
+    def percentiles(self, *ps):
+        if self.total == 0:
+            return [float("nan")] * len(ps)
+        cum = np.cumsum(self.counts)
+        out = []
+        for p in ps:
+            i = int(np.searchsorted(cum, self.total * p / 100.0))
+            # bin i holds values up to edges[i]; the overflow bin reports the max
+            out.append(self.worst if i >= len(self.edges) else min(self.edges[i], self.worst))
+        return out
+
+
+# ==========================================================
+#          GLASS-TO-MOTOR TRACE (PER-HOP HISTOGRAMS)
+# ==========================================================
+# timestamps a frame collects on its way to the motors, in order
+STAMPS = ("capture", "ring", "detect_start", "publish", "control", "motor")
+# hop name -> (from stamp, to stamp)
+HOPS = {
+    "buffering": ("capture", "ring"),       # sensor → shared-memory slot
+    "queue": ("ring", "detect_start"),      # waiting for the vision process
+    "detect": ("detect_start", "publish"),  # YUV split + RoiTracker
+    "pickup": ("publish", "control"),       # until a control tick reads it
+    "control": ("control", "motor"),        # predictor + PID + motor write
+    "total": ("capture", "motor"),
+}
+
+
+def hop_durations(times):
+    """{hop: seconds} from a row of STAMPS times (monotonic seconds)."""
+    at = dict(zip(STAMPS, times))
+    return {hop: at[b] - at[a] for hop, (a, b) in HOPS.items()}
+
+
+class LatencyTrace:
+    """Per-hop histograms of the glass-to-motor path, plus an optional file.
+
+    ``record(frame_id, *times)`` takes one timestamp per entry of STAMPS.
+    With ``path`` every record is also appended to a compact trace file: a
+    one-line JSON header, then rows of float64 (frame id + timestamps),
+    which latency-report.py reads back.
+    """
+
+    def __init__(self, path=None):
+        self.hists = {hop: LatencyHistogram() for hop in HOPS}
+        self.file = None
+        if path:
+            self.file = open(path, "wb")
+            header = {"format": "glass-to-motor", "columns": ["frame_id", *STAMPS]}
+            self.file.write((json.dumps(header) + "\n").encode())
+
+    def record(self, frame_id, *times):
+        for hop, dt in hop_durations(times).items():
+            self.hists[hop].add(dt)
+        if self.file is not None:
+            self.file.write(np.array((frame_id, *times), np.float64).tobytes())
+
+    def report(self):
+        lines = [f"{'hop':>10}  {'p50':>8}  {'p95':>8}  {'p99':>8}  (ms)"]
+        for hop, hist in self.hists.items():
+            p50, p95, p99 = (v * 1000 for v in hist.percentiles(50, 95, 99))
+            lines.append(f"{hop:>10}  {p50:8.2f}  {p95:8.2f}  {p99:8.2f}")
+        lines.append(f"{'frames':>10}  {self.hists['total'].total}")
+        return "\n".join(lines)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_trace(path):
+    """(columns, rows) of a trace file written by LatencyTrace."""
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        offset = f.tell()
+    columns = header["columns"]
+    rows = np.fromfile(path, np.float64, offset=offset)
+    rows = rows[:len(rows) // len(columns) * len(columns)].reshape(-1, len(columns))
+    return columns, rows
@@ -1,22 +1,30 @@
-import cv2
 import numpy as np
 import time
 import threading
-from picamera2 import Picamera2
+import os
 from brickpi3 import BrickPi3
+from predictor import TargetPredictor
+from capture import DualStreamCamera
+from replay import ReplayCamera
+from worker import VisionWorker
+from scheduler import PeriodicScheduler
+from motors import MotorDriver
+from latency import LatencyTrace
+from odometry import Odometry
+from shared import SeqSlot
 
 # ==========================================================
-#              GLOBAL MODE & TIMERS
+#              MANUAL MODE (KEYBOARD → MOTOR THREAD)
 # ==========================================================
-manual_mode = False
-manual_last_time = time.time()
+# the keyboard thread is the only writer; manual mode is simply "a key
+# came in less than MANUAL_TIMEOUT ago", so the motor thread never writes
+manual_input = SeqSlot(("last_input",))
+MANUAL_TIMEOUT = 30    # s of no input → back to autonomous
 
 # ==========================================================
-#              SHARED VARIABLES (THREAD SAFE)
+#        SHARED DETECTION (VISION PROCESS, LOCK-FREE)
 # ==========================================================
-center_x = None
-last_radius = 0
-lock = threading.Lock()
+vision = None          # VisionWorker, started in MAIN
 
 # ==========================================================
 #            CAMERA + CONTROL THRESHOLDS (TUNED)
@@ -29,29 +37,46 @@ REVERSE_SPEED = 300
 ROTATE_LIMIT = 320
 
 KP = 0.32
-KD = 0.18
-last_error = 0
+KD = 0.006             # s; the old 0.18 per frame-to-frame difference at ~30 fps
 
+CONTROL_HZ = 100       # fixed-rate motor loop; timing in motor_loop.stats()
+motor_loop = PeriodicScheduler(1.0 / CONTROL_HZ, name="motor loop", phase=0.0)
+
+# lores px of the 320x320 central crop, the geometry these were tuned on
 RADIUS_FULL = 130
 RADIUS_NEAR = 95
 RADIUS_FAR = 70
 
 CENTER_TOL = 30
 
+# Preview windows (0 → headless, no HighGUI calls at all)
+PREVIEW_FPS = 5 if os.environ.get("DISPLAY") else 0
+
+# Print the control loop timing while running (seconds)
+STATS_EVERY = 10
+
+# Per-hop glass-to-motor latency; LATENCY_TRACE=trace.bin also writes every
+# frame to a file for latency-report.py.  Created in MAIN: the spawned
+# vision process re-imports this file and would truncate the trace.
+trace = None
+
 # ==========================================================
 #                          MOTORS
 # ==========================================================
-BP = BrickPi3()
-LEFT = BP.PORT_D
-RIGHT = BP.PORT_C
+BP = None              # created in MAIN, so the vision process never opens SPI
+motors = None          # MotorDriver over BP: unchanged commands skip the SPI write
+odometry = None        # encoder pose, started in MAIN
+ODOMETRY_HZ = 100
+ODOMETRY_PHASE = 0.5 / CONTROL_HZ   # encoder reads land between motor ticks
+LEFT = BrickPi3.PORT_D
+RIGHT = BrickPi3.PORT_C
 
 def auto_set_motors(left, right):
-    BP.set_motor_dps(LEFT, left)
-    BP.set_motor_dps(RIGHT, right)
+    motors.set_dps(LEFT, left)
+    motors.set_dps(RIGHT, right)
 
 def auto_stop_motors():
-    BP.set_motor_power(LEFT, 0)
-    BP.set_motor_power(RIGHT, 0)
+    motors.stop(LEFT, RIGHT)
 
 # Manual controls
 C = RIGHT
@@ -59,146 +84,130 @@ D = LEFT
 DEFAULT_SPEED = 400
 
 def forward(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(C, speed)
-    BP.set_motor_dps(D, speed)
+    motors.set_dps(C, speed)
+    motors.set_dps(D, speed)
 
 def backward(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(C, -speed)
-    BP.set_motor_dps(D, -speed)
+    motors.set_dps(C, -speed)
+    motors.set_dps(D, -speed)
 
 def rotate_clockwise(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(C, speed)
-    BP.set_motor_dps(D, -speed)
+    motors.set_dps(C, speed)
+    motors.set_dps(D, -speed)
 
 def rotate_anticlockwise(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(C, -speed)
-    BP.set_motor_dps(D, speed)
+    motors.set_dps(C, -speed)
+    motors.set_dps(D, speed)
 
 def stop_manual():
-    BP.set_motor_power(C, 0)
-    BP.set_motor_power(D, 0)
+    motors.stop(C, D)
 
 
 # ==========================================================
-#                   CAMERA THREAD (DETECTION)
+#             VISION PROCESS (DETECTION SETTINGS)
 # ==========================================================
-def camera_thread():
-    global center_x, last_radius
-
-    pic = Picamera2()
-    pic.configure(picap_config := pic.create_preview_configuration(
-        main={"format": "RGB888", "size": (320, 320)}
-    ))
-    pic.start()
-
-    kernel = np.ones((5, 5), np.uint8)
-    LOWER = np.array([35, 70, 60])
-    UPPER = np.array([90, 255, 255])
-
-    while True:
-        frame = pic.capture_array()
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-        mask = cv2.inRange(hsv, LOWER, UPPER)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-
-        cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        cx, radius = None, 0
-
-        if cnts:
-            c = max(cnts, key=cv2.contourArea)
-            if cv2.contourArea(c) > 300:
-                M = cv2.moments(c)
-                if M["m00"] != 0:
-                    cx = int(M["m10"] / M["m00"])
-                (_, _), radius = cv2.minEnclosingCircle(c)
-
-        with lock:
-            center_x = cx
-            last_radius = radius
-
-        cv2.imshow("Frame", frame)
-        cv2.imshow("Mask", mask)
-        if cv2.waitKey(1) & 0xFF == 27:
-            break
-
-    pic.stop()
-    cv2.destroyAllWindows()
+# HSV for green (stable)
+LOWER = np.array([35, 70, 60])
+UPPER = np.array([90, 255, 255])
 
 
 # ==========================================================
 #               MOTOR THREAD (AUTONOMOUS MODE)
 # ==========================================================
 def motor_thread():
-    global manual_mode, manual_last_time, last_error
-
-    while True:
+    # constant-velocity Kalman between detection and the PID
+    predictor = TargetPredictor(max_gap=0.25)
+    last_seq = 0
+    # PID memory lives with the only thread that uses it
+    last_error, last_error_time = 0.0, None
+    det, fresh, picked_up = None, False, 0.0
+    tracking = False
+
+    def tick():
+        """One control step; True if it commanded the motors."""
+        nonlocal last_seq, last_error, last_error_time, det, fresh, picked_up, tracking
+
+        # newest detection from the vision process (never blocks it);
+        # fed even in manual mode so the filter is warm on the way back
+        seq, det = vision.latest()
+        fresh = seq != last_seq
+        if fresh:
+            picked_up = time.monotonic()
+            cx = None if np.isnan(det.cx) else det.cx
+            predictor.update(cx, det.radius, det.capture_time)
+            last_seq = seq
 
         # ---- MANUAL MODE ACTIVE → AUTONOMOUS PAUSED ----
-        if manual_mode:
-            if time.time() - manual_last_time > 30:
-                manual_mode = False  # Auto return to autonomous
-            else:
-                time.sleep(0.01)
-                continue
+        now = time.monotonic()
+        keys, manual = manual_input.read()
+        if keys and now - manual.last_input <= MANUAL_TIMEOUT:
+            last_error_time = None
+            tracking = False
+            return False     # the motors belong to the keyboard
 
         # ---- AUTONOMOUS MODE BELOW ----
-        with lock:
-            cx = center_x
-            radius = last_radius
+        est = predictor.predict(now)
+        cx, radius = (est.cx, est.radius) if est else (None, 0)
+        tracking = cx is not None
 
         if cx is None:
             auto_stop_motors()
-            time.sleep(0.01)
-            continue
+            last_error_time = None
+            return True
 
         if radius > RADIUS_FULL:
             auto_set_motors(-REVERSE_SPEED, -REVERSE_SPEED)
-            time.sleep(0.01)
-            continue
+            return True
 
         if RADIUS_NEAR < radius <= RADIUS_FULL:
             auto_stop_motors()
-            time.sleep(0.01)
-            continue
+            return True
 
         if radius < RADIUS_FAR:
             auto_set_motors(FORWARD_SPEED, FORWARD_SPEED)
-            time.sleep(0.01)
-            continue
+            return True
 
-        # PID rotation
+        # PID rotation (D term over real elapsed time, px/s)
         error = cx - CENTER
-        derivative = error - last_error
-        last_error = error
+        if last_error_time is None:
+            derivative = 0.0
+        else:
+            derivative = (error - last_error) / max(now - last_error_time, 1e-3)
+        last_error, last_error_time = error, now
 
         rotation = KP * error + KD * derivative
         rotation = np.clip(rotation, -ROTATE_LIMIT, ROTATE_LIMIT)
 
         if abs(error) < CENTER_TOL:
             auto_set_motors(FORWARD_SPEED, FORWARD_SPEED)
-            time.sleep(0.01)
-            continue
+            return True
 
         auto_set_motors(-rotation, rotation)
-        time.sleep(0.01)
+        return True
+
+    def traced_tick():
+        # the first motor write that used a new detection closes its trace
+        if tick() and fresh:
+            trace.record(det.frame_id, det.capture_time, det.ring_time, det.detect_start,
+                         det.publish_time, picked_up, time.monotonic())
+        return tracking
+
+    # 100 Hz while there is a target to steer to; with none (motors already
+    # stopped) sleep until the vision process publishes the next detection
+    motor_loop.run(traced_tick, wake=lambda timeout: vision.wait_for(last_seq, timeout))
 
 
 # ==========================================================
 #                     KEYBOARD THREAD
 # ==========================================================
 def keyboard_thread():
-    global manual_mode, manual_last_time
-
     print("\nManual Mode Keys: W/A/S/D/X")
-    print("Auto returns to autonomous after 60 sec of no input.\n")
+    print(f"Auto returns to autonomous after {MANUAL_TIMEOUT} sec of no input.\n")
 
     while True:
         key = input().lower().strip()
 
-        manual_mode = True
-        manual_last_time = time.time()
+        manual_input.write(time.monotonic())
 
         if key == 'w':
             forward()
@@ -217,25 +226,62 @@ def keyboard_thread():
 # ==========================================================
 #                           MAIN
 # ==========================================================
-try:
-    t1 = threading.Thread(target=camera_thread, daemon=True)
-    t2 = threading.Thread(target=motor_thread, daemon=True)
-    t3 = threading.Thread(target=keyboard_thread, daemon=True)
-
-    t1.start()
-    t2.start()
-    t3.start()
-
-    print("Robot Running... Press CTRL + C to stop.")
-
-    while True:
-        time.sleep(1)
-
-except KeyboardInterrupt:
-    pass
-
-finally:
-    auto_stop_motors()
-    stop_manual()
-    BP.reset_all()
-    print("Robot Stopped Safely")
+if __name__ == "__main__":
+    BP = BrickPi3()
+    trace = LatencyTrace(os.environ.get("LATENCY_TRACE"))
+    motors = MotorDriver(BP)
+    odometry = Odometry(motors, left=((LEFT, 1),), right=((RIGHT, 1),), rate=ODOMETRY_HZ,
+                        phase=ODOMETRY_PHASE)
+
+    # detection reads the lores YUV planes in its own process (frames go
+    # through shared memory); nothing here shows main, so it keeps the lores
+    # size: same 320x320 crop the radius thresholds were tuned on, and no
+    # high-resolution buffer filled for nobody
+    # (REPLAY=clip.npy runs on a lores recording, REPLAY_REALTIME=1 paces it)
+    if os.environ.get("REPLAY"):
+        cam = ReplayCamera(os.environ["REPLAY"], realtime=os.environ.get("REPLAY_REALTIME") == "1")
+    else:
+        cam = DualStreamCamera(lores_size=(FRAME_W, FRAME_W), main_size=(FRAME_W, FRAME_W))
+    vision = VisionWorker(cam, LOWER, UPPER, preview_fps=PREVIEW_FPS)
+
+    try:
+        cam.start()             # before the capture thread asks for frames
+        vision.start()
+        odometry.start()
+
+        t2 = threading.Thread(target=motor_thread, daemon=True)
+        t3 = threading.Thread(target=keyboard_thread, daemon=True)
+
+        t2.start()
+        t3.start()
+
+        print("Robot Running... Press CTRL + C to stop.")
+
+        # ESC in the preview ends the vision process
+        last_report = time.monotonic()
+        while vision.alive:
+            time.sleep(1)
+            if time.monotonic() - last_report >= STATS_EVERY:
+                print(motor_loop.summary())
+                print(f"Pose: {odometry.summary()}")
+                last_report = time.monotonic()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        # motors first, and every step on its own: a failing teardown
+        # (e.g. the capture thread still in the ring) must not skip the rest
+        for step in (motor_loop.stop, auto_stop_motors, stop_manual, BP.reset_all,
+                     odometry.stop, vision.stop, cam.stop):
+            try:
+                step()
+            except Exception as e:
+                print(f"Shutdown: {step.__qualname__} failed: {e!r}")
+        print("Robot Stopped Safely")
+        print(motor_loop.summary())
+        print(f"Motor commands: {motors.summary()}")
+        print(f"Final pose: {odometry.summary()}")
+        print("Glass-to-motor latency:")
+        print(trace.report())
+        trace.close()
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+
+import websocket    # websocket-client
+
+from stats import IntervalStats
+
+
+# ==========================================================
+#        MOTOR SETPOINT LINK (CLIENT FOR /motor/ws)
+# ==========================================================
+class MotorLink:
+    """Streams (left, right) dps setpoints to the robot over one WebSocket.
+
+    ``set()`` sends a new setpoint at once; between changes the current one
+    is resent every 1 / ``rate`` s as a heartbeat, which keeps the server's
+    deadman from stopping the motors.  Acks are read on a second thread and
+    their round trip (send → motors written → ack back) goes into ``rtt``.
+    A dropped connection is retried every ``retry`` s; meanwhile the
+    deadman has already stopped the robot.
+    """
+
+    def __init__(self, url, rate=10, timeout=3.0, retry=1.0):
+        self.url = url
+        self.period = 1.0 / rate
+        self.timeout = timeout
+        self.retry = retry
+        self.setpoint = (0, 0)
+        self.seq = 0
+        self.sent = {}          # seq -> send time, until acked
+        self.acked = 0
+        self.rejected = 0       # error acks: the server could not read a setpoint
+        self.rtt = IntervalStats(size=500)
+        self.motor_ms = None    # server-side receive → motors written, last ack
+        self.connected = False
+        self.error = None
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def set(self, left, right):
+        with self.lock:
+            self.setpoint = (int(left), int(right))
+        self.changed.set()
+
+    def stop(self):
+        self.set(0, 0)
+
+    def close(self):
+        self.stop_event.set()
+        self.changed.set()
+        self.thread.join(timeout=self.timeout)
+
+    def _send(self, ws):
+        with self.lock:
+            self.seq += 1
+            left, right = self.setpoint
+            now = time.monotonic()
+            self.sent[self.seq] = now
+            msg = {"seq": self.seq, "left": left, "right": right, "t": now}
+        ws.send(json.dumps(msg))
+
+    def _read_acks(self, ws):
+        while not self.stop_event.is_set():
+            try:
+                ack = json.loads(ws.recv())
+            except Exception:
+                return
+            now = time.monotonic()
+            acked = ack.get("ack")
+            if not isinstance(acked, int) or "error" in ack:
+                # the server could not read a setpoint; nothing to match it to
+                self.rejected += 1
+                continue
+            with self.lock:
+                sent = self.sent.pop(acked, None)
+                # anything older than this ack was lost with a dead connection
+                for seq in [s for s in self.sent if s < acked]:
+                    del self.sent[seq]
+            if sent is not None:
+                self.rtt.add(now - sent)
+            self.acked += 1
+            if ack.get("applied"):
+                self.motor_ms = ack.get("motor_ms")
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                ws = websocket.create_connection(self.url, timeout=self.timeout)
+            except Exception as e:
+                self.connected, self.error = False, str(e)
+                self.stop_event.wait(self.retry)
+                continue
+            self.connected, self.error = True, None
+            reader = threading.Thread(target=self._read_acks, args=(ws,), daemon=True)
+            reader.start()
+            try:
+                while not self.stop_event.is_set() and reader.is_alive():
+                    self._send(ws)
+                    self.changed.wait(self.period)
+                    self.changed.clear()
+                if self.stop_event.is_set():
+                    self.stop()         # don't leave it to the deadman
+                    self._send(ws)
+            except Exception as e:
+                self.error = str(e)
+            finally:
+                self.connected = False
+                try:
+                    ws.close()
+                except Exception:
+                    pass
+                reader.join(timeout=self.timeout)
+
+    def summary(self):
+        if not self.connected:
+            return f"offline ({self.error})" if self.error else "connecting"
+        p50, p95 = self.rtt.percentiles(50, 95)
+        return f"rtt p50 {p50 * 1000:.0f} ms  p95 {p95 * 1000:.0f} ms"
@@ -0,0 +1,76 @@
+import threading
+import time
+
+
+# ==========================================================
+#          MOTOR WRITE-THROUGH CACHE (LESS SPI TRAFFIC)
+# ==========================================================
+class MotorDriver:
+    """Sits in front of a BrickPi3 and drops motor writes that change nothing.
+
+    Every port remembers the last command sent (dps or power) and when.  A
+    new command of the same kind within ``deadband`` of it is skipped, so a
+    control loop can call ``set_dps`` every tick and only real changes go
+    over SPI.  A command that was skipped for ``keepalive`` seconds is sent
+    anyway, so the firmware still hears from us regularly.  ``saved``
+    counts the skipped writes, ``writes`` the ones that went out.
+    """
+
+    def __init__(self, bp, deadband=5, keepalive=0.5):
+        self.bp = bp
+        self.deadband = deadband
+        self.keepalive = keepalive
+        self.last = {}          # port -> (kind, value, time sent)
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.saved = 0
+
+    def _send(self, kind, port, value, deadband):
+        now = time.monotonic()
+        with self.lock:
+            prev = self.last.get(port)
+            if (prev is not None and prev[0] == kind
+                    and abs(value - prev[1]) <= deadband
+                    and now - prev[2] < self.keepalive):
+                self.saved += 1
+                return False
+            if kind == "dps":
+                self.bp.set_motor_dps(port, value)
+            else:
+                self.bp.set_motor_power(port, value)
+            self.last[port] = (kind, value, now)
+            self.writes += 1
+            return True
+
+    def set_dps(self, port, dps):
+        return self._send("dps", port, float(dps), self.deadband)
+
+    def set_power(self, port, power):
+        # power is exact: 0 must always mean stop
+        return self._send("power", port, float(power), 0)
+
+    def stop(self, *ports):
+        for port in ports:
+            self.set_power(port, 0)
+
+    def encoders(self, *ports):
+        """Encoder positions (degrees).
+
+        Each read takes the write lock on its own, not the whole batch, so
+        a motor write waits behind at most one SPI read.
+        """
+        positions = []
+        for port in ports:
+            with self.lock:
+                positions.append(self.bp.get_motor_encoder(port))
+        return positions
+
+    def forget(self):
+        """Drop the cache, e.g. after BP.reset_all(), so the next writes go out."""
+        with self.lock:
+            self.last.clear()
+
+    def summary(self):
+        total = self.writes + self.saved
+        share = self.saved / total if total else 0.0
+        return f"{self.writes} SPI writes, {self.saved} skipped ({share:.0%})"
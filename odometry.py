@@ -0,0 +1,120 @@
+import math
+import time
+from bisect import bisect_right
+from collections import namedtuple
+
+import numpy as np
+
+from scheduler import PeriodicScheduler
+
+
+# ==========================================================
+#        WHEEL ODOMETRY (ENCODERS → DIFFERENTIAL POSE)
+# ==========================================================
+Pose = namedtuple("Pose", "t x y heading")
+
+
+class Odometry:
+    """Integrates a differential-drive pose from the motor encoders.
+
+    ``left`` and ``right`` are ((port, sign), ...) per side; sign is -1
+    for motors mounted mirrored (the A/D motors of the wheel scripts).
+    Encoders are read at ``rate`` Hz through the MotorDriver lock, so the
+    reads queue behind motor writes instead of interleaving on SPI; give a
+    ``phase`` (see PeriodicScheduler) between the motor loop's ticks and
+    they rarely meet at all.
+
+    Poses (metres, radians, monotonic time) go into a preallocated ring of
+    ``history`` rows; ``pose_at(t)`` interpolates between samples.  The
+    heading is stored unwrapped so interpolation across ±pi stays right.
+    """
+
+    def __init__(self, motors, left, right, wheel_diameter=0.056, track_width=0.12,
+                 rate=100, history=6000, phase=None):
+        self.motors = motors
+        self.left = tuple(left)
+        self.right = tuple(right)
+        self.ports = [port for port, _ in self.left + self.right]
+        self.m_per_degree = math.pi * wheel_diameter / 360.0
+        self.track_width = track_width
+
+        self.poses = np.full((history, 4), np.nan)    # t, x, y, heading
+        self.count = 0
+        self.errors = 0
+        self.x = self.y = self.heading = 0.0
+        self.last_ticks = None
+        self.loop = PeriodicScheduler(1.0 / rate, name="odometry", phase=phase)
+
+    def _side(self, ticks, side, offset):
+        return sum(sign * ticks[offset + i] for i, (_, sign) in enumerate(side)) / len(side)
+
+    def sample(self):
+        t0 = time.monotonic()
+        try:
+            ticks = self.motors.encoders(*self.ports)
+        except (IOError, OSError, ValueError):
+            self.errors += 1
+            return
+        t = (t0 + time.monotonic()) / 2     # reads straddle this instant
+
+        if self.last_ticks is not None:
+            n = len(self.left)
+            dl = (self._side(ticks, self.left, 0) - self._side(self.last_ticks, self.left, 0)) * self.m_per_degree
+            dr = (self._side(ticks, self.right, n) - self._side(self.last_ticks, self.right, n)) * self.m_per_degree
+            ds = (dl + dr) / 2
+            dth = (dr - dl) / self.track_width
+            mid = self.heading + dth / 2
+            self.x += ds * math.cos(mid)
+            self.y += ds * math.sin(mid)
+            self.heading += dth
+        self.last_ticks = ticks
+
+        self.poses[self.count % len(self.poses)] = (t, self.x, self.y, self.heading)
+        self.count += 1
+
+    def start(self):
+        return self.loop.start(self.sample)
+
+    def stop(self):
+        self.loop.stop()
+
+    # ----- QUERIES (any thread) -----
+    def _row(self, i, count):
+        # i-th oldest of the samples held when there were ``count``
+        n = len(self.poses)
+        first = count - n if count > n else 0
+        return self.poses[(first + i) % n]
+
+    def pose(self):
+        """Newest Pose, or None before the first sample."""
+        if self.count == 0:
+            return None
+        return self._wrap(self.poses[(self.count - 1) % len(self.poses)].tolist())
+
+    def pose_at(self, t):
+        """Pose interpolated at monotonic time t (newest after the last
+        sample); None if t is older than the history kept."""
+        count = self.count
+        n = min(count, len(self.poses))
+        if n == 0:
+            return None
+        i = bisect_right(range(n), t, key=lambda k: self._row(k, count)[0])
+        if i == 0:
+            return None
+        if i == n:
+            return self._wrap(self._row(n - 1, count).tolist())
+        a, b = self._row(i - 1, count), self._row(i, count)
+        f = (t - a[0]) / (b[0] - a[0]) if b[0] > a[0] else 0.0
+        row = a + f * (b - a)
+        row[0] = t
+        return self._wrap(row.tolist())
+
+    @staticmethod
+    def _wrap(row):
+        t, x, y, heading = row
+        return Pose(t, x, y, math.atan2(math.sin(heading), math.cos(heading)))
+
+    def summary(self):
+        p = self.pose()
+        where = f"x {p.x:+.3f} m  y {p.y:+.3f} m  heading {math.degrees(p.heading):+.1f} deg" if p else "no samples"
+        return f"{where}  ({self.count} samples, {self.errors} read errors)"
@@ -0,0 +1,43 @@
+import math
+import struct
+
+
+# ==========================================================
+#        DETECTION OFFLOAD WIRE FORMAT (BINARY WEBSOCKET)
+# ==========================================================
+# robot → server, one binary message per frame:
+#     FRAME header (frame id, capture time) + JPEG bytes
+# server → robot, one binary message per frame it answers:
+#     RESULT (frame id, capture time echoed, cx, cy, radius, server ms)
+#
+# Capture time is the robot's sensor timestamp (s, its monotonic clock);
+# the server only echoes it, so the two clocks never need to agree.  A
+# frame with no target comes back with cx = cy = radius = NaN.  Frame ids
+# are the robot's own and may skip (frames it chose not to send).
+FRAME = struct.Struct("<Id")
+RESULT = struct.Struct("<Idffff")
+
+NOTHING = (math.nan, math.nan, math.nan)
+
+
+def pack_frame(frame_id, capture_time, jpeg):
+    return FRAME.pack(frame_id, capture_time) + bytes(jpeg)
+
+
+def unpack_frame(data):
+    """(frame id, capture time, JPEG bytes as a memoryview, no copy)."""
+    frame_id, capture_time = FRAME.unpack_from(data)
+    return frame_id, capture_time, memoryview(data)[FRAME.size:]
+
+
+def pack_result(frame_id, capture_time, target=None, server_ms=0.0):
+    """``target`` is (cx, cy, radius) or None when nothing was found."""
+    cx, cy, radius = NOTHING if target is None else target
+    return RESULT.pack(frame_id, capture_time, cx, cy, radius, server_ms)
+
+
+def unpack_result(data):
+    """(frame id, capture time, (cx, cy, radius) or None, server ms)."""
+    frame_id, capture_time, cx, cy, radius, server_ms = RESULT.unpack(data)
+    target = None if math.isnan(cx) else (cx, cy, radius)
+    return frame_id, capture_time, target, server_ms
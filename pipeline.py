@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+from collections import deque
+
+from stats import IntervalStats
+
+
+# ==========================================================
+#        PARALLEL FRAME PIPELINE (IN-ORDER DELIVERY)
+# ==========================================================
+class FramePipeline:
+    """Fans frames out to worker threads, hands results back in frame order.
+
+    ``stages`` is a list of (name, fn); each fn takes the job dict (frame
+    plus the keyword parameters given to ``process``) and adds its output
+    to it.  OpenCV drops the GIL inside its kernels, so several workers
+    keep several cores busy.
+
+    Results come back strictly in sequence order.  If the oldest frame is
+    still running ``skip_after`` seconds after it was submitted while a
+    newer one is done, the newer one is delivered and the older one is
+    dropped as stale when it finishes.
+
+    A stage that raises ends only that job: the exception is re-raised
+    by ``process`` when the job's turn comes, and the worker carries on.
+    """
+
+    def __init__(self, stages, workers=3, depth=None, skip_after=0.1):
+        self.stages = stages
+        self.depth = depth or workers + 1
+        self.skip_after = skip_after
+
+        self.jobs = queue.Queue()
+        self.done = {}              # seq -> finished job
+        self.inflight = deque()     # submitted, not yet delivered, in order
+        self.submitted = {}         # seq -> submit time, until delivered
+        self.cond = threading.Condition()
+        self.next_seq = 0
+        self.delivered = -1
+        self.dropped = 0
+
+        names = [name for name, _ in stages] + ["queue", "reorder", "total"]
+        self.latency = {name: IntervalStats() for name in names}
+
+        self.threads = [threading.Thread(target=self._work, daemon=True)
+                        for _ in range(workers)]
+        for t in self.threads:
+            t.start()
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+
+            t = time.perf_counter()
+            times = [("queue", t - job["t_submit"])]
+            try:
+                for name, fn in self.stages:
+                    fn(job)
+                    now = time.perf_counter()
+                    times.append((name, now - t))
+                    t = now
+            except Exception as e:
+                # finish the job anyway, so nothing waits on it forever;
+                # process() raises it in the caller's thread
+                job["error"] = e
+                t = time.perf_counter()
+            job["t_done"] = t
+
+            with self.cond:
+                for name, dt in times:
+                    self.latency[name].add(dt)
+                if job["seq"] <= self.delivered:
+                    self.dropped += 1       # a newer frame already went out
+                else:
+                    self.done[job["seq"]] = job
+                self.cond.notify_all()
+
+    def submit(self, frame, **params):
+        t = time.perf_counter()
+        with self.cond:
+            seq = self.next_seq
+            self.next_seq += 1
+            self.inflight.append(seq)
+            self.submitted[seq] = t
+        self.jobs.put(dict(params, frame=frame, seq=seq, t_submit=t))
+        return seq
+
+    def _take_ready(self):
+        # called with self.cond held
+        while self.inflight and self.inflight[0] <= self.delivered:
+            self.inflight.popleft()
+        if not self.inflight:
+            return None
+
+        oldest = self.inflight[0]
+        if oldest in self.done:
+            seq = oldest
+        else:
+            newer = [s for s in self.done if s > oldest]
+            waited = time.perf_counter() - self.submitted[oldest]
+            if not newer or waited < self.skip_after:
+                return None
+            seq = min(newer)
+
+        job = self.done.pop(seq)
+        self.delivered = seq
+        for stale in [s for s in self.done if s < seq]:
+            del self.done[stale]
+            self.dropped += 1
+        for s in [s for s in self.submitted if s <= seq]:
+            del self.submitted[s]
+        now = time.perf_counter()
+        self.latency["reorder"].add(now - job["t_done"])
+        self.latency["total"].add(now - job["t_submit"])
+        return job
+
+    def process(self, frame, **params):
+        """Submit a frame; return the next in-order finished job, or None.
+
+        Blocks only while ``depth`` frames are already in flight, so after
+        a short warm-up there is one result out per frame in.  If a stage
+        raised on the job being delivered, that exception is raised here.
+        """
+        self.submit(frame, **params)
+        with self.cond:
+            while True:
+                job = self._take_ready()
+                if job is not None or len(self.inflight) < self.depth:
+                    break
+                self.cond.wait(self.skip_after / 4)
+        if job is not None and "error" in job:
+            raise job["error"]
+        return job
+
+    def report(self):
+        lines = []
+        for name, stats in self.latency.items():
+            p50, p99 = stats.percentiles(50, 99)
+            lines.append(f"{name:>10}: p50 {p50 * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms")
+        lines.append(f"{'dropped':>10}: {self.dropped} stale results")
+        return "\n".join(lines)
+
+    def close(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for t in self.threads:
+            t.join(timeout=1)
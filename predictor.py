@@ -0,0 +1,95 @@
+from collections import namedtuple
+
+
+# ==========================================================
+#           CONSTANT-VELOCITY KALMAN FILTER (1-D)
+# ==========================================================
+class ConstantVelocityKalman:
+    """Position/velocity Kalman filter for one coordinate.
+
+    ``q`` is the white-noise acceleration density (px^2/s^3) and ``r`` the
+    measurement variance (px^2).  Covariance is kept as its three
+    independent terms since the 2x2 matrix is symmetric.
+    """
+
+    def __init__(self, q=4000.0, r=9.0):
+        self.q = q
+        self.r = r
+        self.x = None       # position
+        self.v = 0.0        # velocity
+        self.t = None       # time of the current state
+        self.pxx, self.pxv, self.pvv = 0.0, 0.0, 0.0
+
+    def _propagate(self, dt):
+        q = self.q
+        x = self.x + self.v * dt
+        pxx = self.pxx + 2 * dt * self.pxv + dt * dt * self.pvv + q * dt ** 3 / 3
+        pxv = self.pxv + dt * self.pvv + q * dt ** 2 / 2
+        pvv = self.pvv + q * dt
+        return x, pxx, pxv, pvv
+
+    def update(self, z, t):
+        if self.x is None:
+            self.x, self.v, self.t = float(z), 0.0, t
+            self.pxx, self.pxv, self.pvv = self.r, 0.0, 1e4
+            return
+
+        x, pxx, pxv, pvv = self._propagate(max(0.0, t - self.t))
+        s = pxx + self.r
+        kx, kv = pxx / s, pxv / s
+        y = z - x
+
+        self.x = x + kx * y
+        self.v = self.v + kv * y
+        self.pxx = (1 - kx) * pxx
+        self.pxv = (1 - kx) * pxv
+        self.pvv = pvv - kv * pxv
+        self.t = t
+
+    def predict(self, t):
+        """(position, velocity, position variance) at time t, state untouched."""
+        x, pxx, _, _ = self._propagate(max(0.0, t - self.t))
+        return x, self.v, pxx
+
+
+# ==========================================================
+#              TARGET PREDICTOR (CX + RADIUS)
+# ==========================================================
+Estimate = namedtuple("Estimate", "cx vx radius var_cx var_radius age")
+
+
+class TargetPredictor:
+    """Bridges detection gaps and runs ahead of the camera for the PID.
+
+    Feed it every detection with its capture time (cx None for a miss);
+    ``predict`` extrapolates to any control tick.  The target is dropped
+    once no detection has arrived for ``max_gap`` seconds.
+    """
+
+    def __init__(self, max_gap=0.25, q_cx=4000.0, r_cx=9.0, q_radius=500.0, r_radius=4.0):
+        self.max_gap = max_gap
+        self.params = (q_cx, r_cx, q_radius, r_radius)
+        self.reset()
+
+    def reset(self):
+        q_cx, r_cx, q_radius, r_radius = self.params
+        self.cx = ConstantVelocityKalman(q_cx, r_cx)
+        self.radius = ConstantVelocityKalman(q_radius, r_radius)
+        self.last_seen = None
+
+    def update(self, cx, radius, t):
+        if self.last_seen is not None and t - self.last_seen > self.max_gap:
+            self.reset()
+        if cx is None:
+            return
+        self.cx.update(cx, t)
+        self.radius.update(radius, t)
+        self.last_seen = t
+
+    def predict(self, t):
+        """Estimate at time t, or None when there is no live target."""
+        if self.last_seen is None or t - self.last_seen > self.max_gap:
+            return None
+        cx, vx, var_cx = self.cx.predict(t)
+        radius, _, var_radius = self.radius.predict(t)
+        return Estimate(cx, vx, radius, var_cx, var_radius, t - self.last_seen)
@@ -0,0 +1,84 @@
+import threading
+import time
+import cv2
+import numpy as np
+
+
+# ==========================================================
+#            THROTTLED PREVIEW (OFF THE DETECTION LOOP)
+# ==========================================================
+class PreviewSink:
+    """Shows frames at most ``fps`` times a second on its own thread.
+
+    ``show`` only copies the image when a new preview frame is due, so the
+    detection loop never waits on imshow/waitKey.  ESC in any window sets
+    ``closed``.
+    """
+
+    def __init__(self, fps=5):
+        self.period = 1.0 / fps
+        self.images = {}
+        self.next_due = 0.0
+        self.lock = threading.Lock()
+        self.new_frame = threading.Event()
+        self.closed = False
+        self.rendered = 0
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def show(self, **images):
+        """Offer named images (window name=image); dropped unless due."""
+        now = time.monotonic()
+        if now < self.next_due:
+            return False
+        self.next_due = now + self.period
+
+        with self.lock:
+            for name, img in images.items():
+                buf = self.images.get(name)
+                if buf is None or buf.shape != img.shape:
+                    self.images[name] = np.array(img)
+                else:
+                    np.copyto(buf, img)
+        self.new_frame.set()
+        return True
+
+    def _run(self):
+        while not self.closed:
+            if self.new_frame.wait(0.1):
+                self.new_frame.clear()
+                with self.lock:
+                    for name, img in self.images.items():
+                        cv2.imshow(name, img)
+                self.rendered += 1
+            if cv2.waitKey(1) & 0xFF == 27:
+                self.closed = True
+        cv2.destroyAllWindows()
+
+    def close(self):
+        self.closed = True
+        self.thread.join(timeout=1)
+
+
+# ==========================================================
+#                       FPS COUNTER
+# ==========================================================
+class FpsMeter:
+    """Counts loop iterations and prints the rate every ``every`` seconds."""
+
+    def __init__(self, label, every=5.0):
+        self.label = label
+        self.every = every
+        self.count = 0
+        self.start = time.monotonic()
+        self.fps = 0.0
+
+    def tick(self, extra=""):
+        self.count += 1
+        elapsed = time.monotonic() - self.start
+        if elapsed >= self.every:
+            self.fps = self.count / elapsed
+            print(f"{self.label}: {self.fps:.1f} fps {extra}".rstrip())
+            self.count = 0
+            self.start += elapsed
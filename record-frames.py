@@ -0,0 +1,29 @@
+import sys
+from capture import DualStreamCamera
+from replay import FrameRecorder
+
+# usage: python record-frames.py out.npy [frames] [main|lores]
+#   main  = 320x320 RGB888, what colour-trace / wheel-automove capture
+#   lores = 320x320 YUV420, what the automove vision process reads
+path = sys.argv[1] if len(sys.argv) > 1 else "recording.npy"
+frames = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+stream = sys.argv[3] if len(sys.argv) > 3 else "main"
+
+if stream == "lores":
+    cam = DualStreamCamera(lores_size=(320, 320), main_size=(320, 320))
+    shape = cam.lores_shape
+else:
+    cam = DualStreamCamera(lores_size=None, main_size=(320, 320))
+    shape = (320, 320, 3)
+
+rec = FrameRecorder(path, shape, max_frames=frames)
+cam.start()
+try:
+    while rec.capture_from(cam, stream):
+        pass
+except KeyboardInterrupt:
+    pass
+finally:
+    cam.stop()
+    print(f"Recorded {rec.count} {stream} frames to {path}")
+    rec.close()
@@ -0,0 +1,141 @@
+import time
+
+import numpy as np
+
+
+# ==========================================================
+#           FRAME RECORDING (MEMORY-MAPPED .npy FILE)
+# ==========================================================
+def _record_dtype(shape):
+    return np.dtype([("t", np.float64), ("frame", np.uint8, tuple(shape))])
+
+
+class FrameRecorder:
+    """Writes frames and capture timestamps straight into a memory-mapped file.
+
+    The file is a plain .npy array of (t, frame) records, preallocated for
+    ``max_frames``; unused records keep t = NaN, so the file can be
+    replayed even if recording was cut short.
+    """
+
+    def __init__(self, path, shape, max_frames=600):
+        self.path = path
+        self.records = np.lib.format.open_memmap(
+            path, mode="w+", dtype=_record_dtype(shape), shape=(max_frames,))
+        self.records["t"] = np.nan
+        self.count = 0
+
+    def add(self, frame, t=None):
+        if self.count >= len(self.records):
+            return False
+        rec = self.records[self.count]
+        rec["frame"] = frame
+        rec["t"] = time.monotonic() if t is None else t
+        self.count += 1
+        return True
+
+    def capture_from(self, camera, stream="lores"):
+        """Record the next camera frame without an intermediate array."""
+        if self.count >= len(self.records):
+            return False
+        t = camera.capture_into(self.records["frame"][self.count], stream)
+        self.records["t"][self.count] = t
+        self.count += 1
+        return True
+
+    def close(self):
+        self.records.flush()
+        del self.records
+
+
+# ==========================================================
+#        REPLAY SOURCE (SAME INTERFACE AS THE CAMERAS)
+# ==========================================================
+class ReplayCamera:
+    """Serves a recording through the Picamera2 / DualStreamCamera calls.
+
+    The file is mapped read-only and ``capture_array`` copies each frame
+    into one of ``buffers`` preallocated arrays, used in turn: callers may
+    draw on what they get without touching the clip, so every loop of a
+    replay is the same input.  More than one buffer because a frame handed
+    to FramePipeline is still in use while the next ones are captured (up
+    to ``depth`` of them); keep ``buffers`` above that.  With ``realtime``
+    the frames are paced by their recorded timestamps, otherwise they come
+    as fast as they are asked for.  At the end it loops (or raises
+    EOFError).
+    """
+
+    def __init__(self, path, realtime=False, loop=True, buffers=8):
+        records = np.load(path, mmap_mode="r")
+        t = records["t"]
+        count = int(np.argmax(np.isnan(t))) if np.isnan(t).any() else len(t)
+        if count == 0:
+            raise ValueError(f"{path} holds no frames")
+
+        self.frames = records["frame"][:count]
+        self.times = np.asarray(t[:count])
+        self.realtime = realtime
+        self.loop = loop
+        self.index = 0
+        self.start_wall = None
+        self.buffers = np.empty((buffers,) + self.frames.shape[1:], self.frames.dtype)
+        self.next_buffer = 0
+
+        shape = self.frames.shape[1:]
+        self.sensor_resolution = (shape[1], shape[0])
+        # lores YUV420 recordings are (h * 3 / 2, stride)
+        self.lores_shape = shape
+        self.lores_size = (shape[1], shape[0] * 2 // 3) if len(shape) == 2 else self.sensor_resolution
+
+    def __len__(self):
+        return len(self.frames)
+
+    # ----- Picamera2-style calls used by the scripts -----
+    def create_preview_configuration(self, main=None, lores=None, **kwargs):
+        return {"main": main, "lores": lores}
+
+    def configure(self, config):
+        pass
+
+    def start(self):
+        self.start_wall = time.monotonic()
+
+    def stop(self):
+        pass
+
+    def warm(self):
+        """Touch every page once so timing runs do not measure disk reads."""
+        return sum(int(f.reshape(-1)[::4096].sum()) for f in self.frames)
+
+    def _next(self):
+        """Index of the next frame and its capture time on today's clock."""
+        if self.index >= len(self.frames):
+            if not self.loop:
+                raise EOFError("end of recording")
+            self.index = 0
+            self.start_wall = time.monotonic()
+        i = self.index
+        self.index += 1
+
+        if not self.realtime:
+            return i, time.monotonic()
+
+        if self.start_wall is None:
+            self.start_wall = time.monotonic()
+        due = self.start_wall + (self.times[i] - self.times[0])
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return i, due
+
+    def capture_array(self, name=None):
+        out = self.buffers[self.next_buffer]
+        self.next_buffer = (self.next_buffer + 1) % len(self.buffers)
+        np.copyto(out, self.frames[self._next()[0]])
+        return out
+
+    # ----- DualStreamCamera-style calls -----
+    def capture_into(self, out, stream="lores"):
+        i, t = self._next()
+        np.copyto(out, self.frames[i])
+        return t
@@ -0,0 +1,134 @@
+import math
+import threading
+import time
+
+from stats import IntervalStats
+
+
+# ==========================================================
+#          FIXED-RATE SCHEDULER (MONOTONIC, NO DRIFT)
+# ==========================================================
+class PeriodicScheduler:
+    """Calls a function every ``period`` seconds and keeps score.
+
+    Deadlines are start + k * period on the monotonic clock, so sleep
+    error and callback time never accumulate into drift.  A tick that ends
+    past the next deadline is an overrun: the deadlines it covered are
+    counted as missed and skipped (no burst of catch-up calls), and
+    ``miss_streak`` / ``worst_streak`` track consecutive overruns.
+
+    ``late`` holds how far after its deadline each tick started (jitter),
+    ``interval`` the time between tick starts and ``busy`` the callback
+    time.  All of it can be read from another thread while running.
+
+    With ``wake``, a tick that returns False (nothing to control) parks
+    the loop in ``wake(idle_timeout)``, a blocking wait for news such as
+    VisionWorker.wait_for, instead of ticking on; it resumes the fixed
+    rate from a fresh start when that returns.  ``parked`` counts these.
+
+    With ``phase`` (s), deadlines sit at phase + k * period of the
+    monotonic clock itself rather than from whenever the loop started, so
+    two loops sharing a bus can be kept apart: a motor loop at phase 0 and
+    an encoder poll half a period later never tick together, even after
+    the motor loop has parked.
+    """
+
+    def __init__(self, period, name="loop", phase=None):
+        self.period = period
+        self.name = name
+        self.phase = phase
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.late = IntervalStats()
+        self.interval = IntervalStats()
+        self.busy = IntervalStats()
+        self.ticks = 0
+        self.overruns = 0
+        self.missed = 0
+        self.miss_streak = 0
+        self.worst_streak = 0
+        self.parked = 0
+
+    def _start(self):
+        now = time.monotonic()
+        if self.phase is None:
+            return now
+        return math.ceil((now - self.phase) / self.period) * self.period + self.phase
+
+    def run(self, fn, wake=None, idle_timeout=0.5):
+        """Run ``fn()`` at the fixed rate in this thread until ``stop()``."""
+        period = self.period
+        start = self._start()
+        k = 0
+        while not self.stop_event.is_set():
+            deadline = start + k * period
+            delay = deadline - time.monotonic()
+            if delay > 0 and self.stop_event.wait(delay):
+                break
+
+            t = time.monotonic()
+            self.late.add(t - deadline)
+            self.interval.tick(t)
+            active = fn()
+            end = time.monotonic()
+            self.busy.add(end - t)
+            self.ticks += 1
+
+            if wake is not None and active is False:
+                self.parked += 1
+                wake(idle_timeout)
+                start, k = self._start(), 0
+                self.interval.last = None       # the parked gap is not jitter
+                self.miss_streak = 0
+                continue
+
+            # next deadline still ahead → on time; otherwise skip to it
+            k += 1
+            if end > start + k * period:
+                behind = int((end - start) / period) + 1 - k
+                self.overruns += 1
+                self.missed += behind
+                self.miss_streak += 1
+                self.worst_streak = max(self.worst_streak, self.miss_streak)
+                k += behind
+            else:
+                self.miss_streak = 0
+
+    def start(self, fn, wake=None, idle_timeout=0.5):
+        """Run ``fn`` on a daemon thread; returns the thread."""
+        self.thread = threading.Thread(target=self.run, args=(fn, wake, idle_timeout), daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+
+    def stats(self):
+        """Counters plus p50/p99/max of lateness, interval and busy time (s)."""
+        out = {
+            "rate_hz": 1.0 / self.period,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "missed": self.missed,
+            "miss_streak": self.miss_streak,
+            "worst_streak": self.worst_streak,
+            "parked": self.parked,
+        }
+        for key in ("late", "interval", "busy"):
+            s = getattr(self, key)
+            n = min(s.count, len(s.samples))
+            p50, p99 = s.percentiles(50, 99)
+            out[key] = {"p50": p50, "p99": p99, "max": s.samples[:n].max() if n else float("nan")}
+        return out
+
+    def summary(self):
+        s = self.stats()
+        return (f"{self.name} @ {s['rate_hz']:.0f} Hz: {s['ticks']} ticks, "
+                f"{s['overruns']} overruns ({s['missed']} deadlines missed, "
+                f"worst streak {s['worst_streak']}, parked {s['parked']} times)\n"
+                f"    late     {self.late.summary()}\n"
+                f"    interval {self.interval.summary()}\n"
+                f"    busy     {self.busy.summary()}")
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+
+# ==========================================================
+#                 MEMORY FENCE (FOR SEQLOCKS)
+# ==========================================================
+_fence_lock = threading.Lock()
+
+
+def memory_fence():
+    """Order the shared-memory stores (or loads) before this call before
+    the ones after it, as seen from other cores and processes.
+
+    numpy stores are plain stores, which the ARM cores of the Pi may make
+    visible out of order, so a seqlock needs a fence between its counter
+    and its data.  Python has no fence of its own; taking and releasing a
+    lock is one of the operations POSIX requires to synchronise memory
+    (threading.Lock is a semaphore or mutex underneath).  The lock is
+    private, so it only ever contends with another fence in this process.
+    """
+    with _fence_lock:
+        pass
+
+
+# ==========================================================
+#           LOCK-FREE SNAPSHOT SLOT (SEQLOCK STYLE)
+# ==========================================================
+class SeqSlot:
+    """One writer publishes a record of float fields; readers never block it.
+
+    The writer bumps the sequence number to odd, copies the fields, then
+    bumps it to even.  A reader retries until it sees the same even number
+    before and after copying, so it never returns a torn record; a
+    memory_fence() sits between the counter and the fields on both sides,
+    so this also holds across cores on ARM.  Pass
+    ``buf`` (e.g. a SharedMemory buffer) to share the slot between
+    processes; None values are stored as NaN.
+    """
+
+    def __init__(self, fields, buf=None):
+        self.Record = namedtuple("Record", fields)
+        self.array = np.ndarray((len(fields) + 1,), np.float64, buffer=buf)
+        if buf is None:
+            self.array[:] = 0
+
+    @staticmethod
+    def nbytes(fields):
+        return (len(fields) + 1) * 8
+
+    @property
+    def seq(self):
+        """Number of completed writes."""
+        return int(self.array[0]) // 2
+
+    def write(self, *values):
+        a = self.array
+        a[0] += 1
+        memory_fence()
+        a[1:] = [np.nan if v is None else v for v in values]
+        memory_fence()
+        a[0] += 1
+
+    def read(self):
+        """Return (seq, Record) of the latest complete write; seq 0 = empty."""
+        a = self.array
+        while True:
+            start = a[0]
+            if not start % 2:
+                memory_fence()
+                values = a[1:].tolist()
+                memory_fence()
+                if a[0] == start:
+                    return int(start) // 2, self.Record(*values)
+            time.sleep(0)       # let a writer in this process finish
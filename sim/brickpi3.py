@@ -0,0 +1,151 @@
+import math
+import os
+import random
+import threading
+import time
+
+# ==========================================================
+#        SIMULATED BRICKPI3 (DROP-IN FOR THE DEXTER MODULE)
+# ==========================================================
+# usage: PYTHONPATH=sim python track-automove.py   (from New/: PYTHONPATH=../sim)
+#
+# SIM_SPI_LATENCY     seconds per SPI transaction (default 0.0002)
+# SIM_DISTANCE_CM     mean ultrasonic distance (default 100)
+# SIM_SENSOR_ERRORS   share of ultrasonic reads that raise SensorError (0.02)
+#
+# Every call holds one bus lock for SPI_LATENCY, like the real SPI bus, so
+# motor writes, encoder reads and sensor reads from different threads
+# queue behind each other.  Motors follow their setpoint with a first-order
+# lag and integrate it into the encoder.
+SPI_LATENCY = float(os.environ.get("SIM_SPI_LATENCY", 0.0002))
+DISTANCE_CM = float(os.environ.get("SIM_DISTANCE_CM", 100))
+SENSOR_ERRORS = float(os.environ.get("SIM_SENSOR_ERRORS", 0.02))
+
+MOTOR_TAU = 0.08            # s, motor speed time constant
+DPS_PER_POWER = 10.0        # power 100 % ≈ 1000 dps, no load
+SENSOR_WARMUP = 0.1         # s of "invalid sensor data" after set_sensor_type
+
+_bus = threading.Lock()
+
+
+class SensorError(Exception):
+    """Same name as brickpi3.SensorError, raised for a bad sensor read."""
+
+
+class _SensorType:
+    NONE = 1
+    EV3_ULTRASONIC_CM = 43
+    EV3_ULTRASONIC_INCHES = 44
+
+
+class _Motor:
+    def __init__(self):
+        self.target = 0.0       # dps
+        self.speed = 0.0        # dps
+        self.position = 0.0     # degrees
+        self.offset = 0.0
+        self.power = 0
+        self.t = time.monotonic()
+
+    def advance(self, now):
+        dt = now - self.t
+        if dt <= 0:
+            return
+        # exact first-order response over dt: speed → target
+        decay = math.exp(-dt / MOTOR_TAU)
+        start = self.speed
+        self.speed = self.target + (start - self.target) * decay
+        self.position += self.target * dt + (start - self.target) * MOTOR_TAU * (1 - decay)
+        self.t = now
+
+
+class BrickPi3:
+    PORT_1, PORT_2, PORT_3, PORT_4 = 0x01, 0x02, 0x04, 0x08
+    PORT_A, PORT_B, PORT_C, PORT_D = 0x01, 0x02, 0x04, 0x08
+    SENSOR_TYPE = _SensorType
+
+    def __init__(self, addr=1, detect=True):
+        self.motors = {port: _Motor() for port in (self.PORT_A, self.PORT_B, self.PORT_C, self.PORT_D)}
+        self.sensors = {}       # port -> (type, time configured)
+        self.transactions = 0
+        self.t0 = time.monotonic()
+
+    def _spi(self):
+        with _bus:
+            self.transactions += 1
+            if SPI_LATENCY > 0:
+                time.sleep(SPI_LATENCY)
+
+    def _ports(self, port):
+        # ports can be OR-ed together, as with the real module
+        return [p for p in self.motors if port & p]
+
+    # ----- motors -----
+    def set_motor_dps(self, port, dps):
+        self._spi()
+        now = time.monotonic()
+        for p in self._ports(port):
+            m = self.motors[p]
+            m.advance(now)
+            m.target, m.power = float(int(dps)), 0
+
+    def set_motor_power(self, port, power):
+        self._spi()
+        now = time.monotonic()
+        for p in self._ports(port):
+            m = self.motors[p]
+            m.advance(now)
+            # -128 is "float": let it coast down like power 0
+            m.power = 0 if power == -128 else int(power)
+            m.target = m.power * DPS_PER_POWER
+
+    def get_motor_encoder(self, port):
+        self._spi()
+        m = self.motors[port]
+        m.advance(time.monotonic())
+        return int(m.position - m.offset)
+
+    def offset_motor_encoder(self, port, position):
+        self._spi()
+        for p in self._ports(port):
+            self.motors[p].offset += position
+
+    def reset_motor_encoder(self, port):
+        for p in self._ports(port):
+            self.offset_motor_encoder(p, self.get_motor_encoder(p))
+
+    def get_motor_status(self, port):
+        """[flags, power, encoder, dps] like the real call."""
+        self._spi()
+        m = self.motors[port]
+        m.advance(time.monotonic())
+        return [0, m.power, int(m.position - m.offset), int(m.speed)]
+
+    # ----- sensors -----
+    def set_sensor_type(self, port, sensor_type, params=0):
+        self._spi()
+        self.sensors[port] = (sensor_type, time.monotonic())
+
+    def get_sensor(self, port):
+        self._spi()
+        if port not in self.sensors or self.sensors[port][0] == _SensorType.NONE:
+            raise SensorError("get_sensor error: Sensor not configured")
+        sensor_type, since = self.sensors[port]
+        now = time.monotonic()
+        if now - since < SENSOR_WARMUP or random.random() < SENSOR_ERRORS:
+            raise SensorError("get_sensor error: Invalid sensor data")
+
+        # slow drift around the mean plus a little noise, clipped like the EV3
+        cm = DISTANCE_CM + 0.4 * DISTANCE_CM * math.sin((now - self.t0) / 5.0) + random.gauss(0, 0.5)
+        cm = round(min(max(cm, 3.0), 255.0), 1)
+        if sensor_type == _SensorType.EV3_ULTRASONIC_INCHES:
+            return round(cm / 2.54, 1)
+        return cm
+
+    def reset_all(self):
+        self._spi()
+        now = time.monotonic()
+        for m in self.motors.values():
+            m.advance(now)
+            m.target, m.power = 0.0, 0
+        self.sensors.clear()
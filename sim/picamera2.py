@@ -0,0 +1,189 @@
+import math
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# ==========================================================
+#        SIMULATED PICAMERA2 (DROP-IN, SYNTHETIC OR RECORDED)
+# ==========================================================
+# usage: PYTHONPATH=sim python wheel-automove.py   (from New/: PYTHONPATH=../sim)
+#
+# SIM_FPS             frame rate of the simulated sensor (default 30)
+# SIM_CAMERA_LATENCY  sensor-to-delivery delay in seconds (default 0.02)
+# SIM_SENSOR          sensor resolution WxH (default 3280x2464, the v2 module)
+# SIM_FRAMES          record-frames.py .npy to serve instead of the synthetic
+#                     ring (main-stream recordings are resized to fit, lores
+#                     I420 recordings must match the lores size)
+#
+# Frames come off a free-running sensor clock: a capture waits for the next
+# frame boundary, so a slow reader drops frames just like on the Pi.
+FPS = float(os.environ.get("SIM_FPS", 30))
+CAMERA_LATENCY = float(os.environ.get("SIM_CAMERA_LATENCY", 0.02))
+SENSOR = tuple(int(v) for v in os.environ.get("SIM_SENSOR", "3280x2464").lower().split("x"))
+FRAMES = os.environ.get("SIM_FRAMES")
+
+_CHANNELS = {"RGB888": 3, "BGR888": 3, "XBGR8888": 4, "XRGB8888": 4}
+
+
+def _stride(width):
+    return (width + 63) // 64 * 64
+
+
+class _Scene:
+    """A green ring moving across a fixed noisy background, any size."""
+
+    def __init__(self):
+        self.backgrounds = {}
+        self.recording = None
+        if FRAMES:
+            self.recording = np.load(FRAMES, mmap_mode="r")["frame"]
+
+    def bgr(self, size, n):
+        w, h = size
+        if self.recording is not None and self.recording.ndim == 4:
+            frame = self.recording[n % len(self.recording)]
+            return frame if frame.shape[1::-1] == (w, h) else cv2.resize(frame, (w, h))
+        if size not in self.backgrounds:
+            rng = np.random.default_rng(0)
+            self.backgrounds[size] = rng.integers(0, 120, (h, w, 3), dtype=np.uint8)
+        frame = self.backgrounds[size].copy()
+        phase = n / (4 * FPS)       # one sweep every 4 s
+        cx = int(w * (0.5 + 0.35 * math.sin(2 * math.pi * phase)))
+        r = int(min(w, h) * (0.12 + 0.05 * math.sin(2 * math.pi * phase / 3)))
+        cv2.circle(frame, (cx, h // 2), r, (40, 180, 60), -1)
+        return frame
+
+    def stream(self, cfg, n):
+        w, h = cfg["size"]
+        fmt = cfg["format"]
+        if fmt == "YUV420":
+            if self.recording is not None and self.recording.ndim == 3:
+                return np.array(self.recording[n % len(self.recording)])
+            i420 = cv2.cvtColor(self.bgr((w, h), n), cv2.COLOR_BGR2YUV_I420)
+            stride = cfg["stride"]
+            if stride == w:
+                return i420
+            # pad each plane row out to the stride, like the ISP buffers
+            out = np.zeros((h * 3 // 2, stride), np.uint8)
+            out[:h, :w] = i420[:h]
+            chroma = out[h:].reshape(-1)
+            src = i420[h:].reshape(-1)
+            half = h // 2 * w // 2
+            for k in range(2):
+                plane = src[k * half:(k + 1) * half].reshape(h // 2, w // 2)
+                dst = chroma[k * h // 2 * stride // 2:(k + 1) * h // 2 * stride // 2]
+                dst.reshape(h // 2, stride // 2)[:, :w // 2] = plane
+            return out
+        frame = self.bgr((w, h), n)
+        if _CHANNELS.get(fmt, 3) == 4:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+        return np.array(frame)
+
+
+class _Request:
+    # streams are rendered on first use, so reading only lores stays cheap
+    def __init__(self, camera, n, metadata):
+        self.camera = camera
+        self.n = n
+        self.metadata = metadata
+        self.arrays = {}
+
+    def make_array(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = self.camera._scene.stream(self.camera.config[name], self.n)
+        return self.arrays[name]
+
+    def get_metadata(self):
+        return self.metadata
+
+    def release(self):
+        self.arrays = {}
+
+
+class MappedArray:
+    def __init__(self, request, stream):
+        self.request = request
+        self.stream = stream
+
+    def __enter__(self):
+        self.array = self.request.make_array(self.stream)
+        return self
+
+    def __exit__(self, *exc):
+        self.array = None
+
+
+class Picamera2:
+    _scene = None
+    _lock = threading.Lock()
+
+    def __init__(self, camera_num=0):
+        self.sensor_resolution = SENSOR
+        self.config = None
+        self.started = None
+        self.frame = -1         # last frame number handed out
+        with Picamera2._lock:
+            if Picamera2._scene is None:
+                Picamera2._scene = _Scene()
+
+    def create_preview_configuration(self, main=None, lores=None, **kwargs):
+        config = {"main": {"format": "XBGR8888", "size": (640, 480)}, "lores": None}
+        if main:
+            config["main"].update(main)
+        if lores:
+            config["lores"] = {"format": "YUV420", **lores}
+        config.update(kwargs)
+        return config
+
+    create_video_configuration = create_preview_configuration
+    create_still_configuration = create_preview_configuration
+
+    def configure(self, config):
+        config = {k: (dict(v) if isinstance(v, dict) else v) for k, v in config.items()}
+        for name in ("main", "lores"):
+            stream = config.get(name)
+            if stream:
+                stream["size"] = tuple(stream["size"])
+                w = stream["size"][0]
+                stream["stride"] = _stride(w) if stream["format"] == "YUV420" else w * _CHANNELS.get(stream["format"], 3)
+        self.config = config
+
+    def camera_configuration(self):
+        return self.config
+
+    def start(self, *args, **kwargs):
+        if self.config is None:
+            self.configure(self.create_preview_configuration())
+        self.started = time.monotonic()
+
+    def stop(self):
+        self.started = None
+
+    def close(self):
+        self.stop()
+
+    def _wait_frame(self):
+        """Block until the next unseen frame is delivered; its (number, sensor time)."""
+        if self.started is None:
+            raise RuntimeError("Camera must be started before capturing")
+        interval = 1.0 / FPS
+        since = time.monotonic() - self.started - CAMERA_LATENCY
+        n = max(self.frame + 1, int(since / interval) + 1)
+        exposed = self.started + n * interval
+        delay = exposed + CAMERA_LATENCY - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.frame = n
+        return n, exposed
+
+    def capture_array(self, name="main"):
+        n, _ = self._wait_frame()
+        return self._scene.stream(self.config[name], n)
+
+    def capture_request(self):
+        n, exposed = self._wait_frame()
+        return _Request(self, n, {"SensorTimestamp": int(exposed * 1e9),
+                                  "FrameDuration": int(1e6 / FPS)})
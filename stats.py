@@ -0,0 +1,41 @@
+import time
+
+import numpy as np
+
+
+# ==========================================================
+#             INTERVAL / LATENCY PERCENTILES
+# ==========================================================
+class IntervalStats:
+    """Keeps the last ``size`` samples (seconds) for percentile reports.
+
+    ``tick()`` records the time since the previous tick, which is how loop
+    jitter is measured; ``add()`` records any other duration.
+    """
+
+    def __init__(self, size=2000):
+        self.samples = np.zeros(size)
+        self.count = 0
+        self.last = None
+
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+        if self.last is not None:
+            self.add(now - self.last)
+        self.last = now
+
+    def add(self, value):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+
+    def percentiles(self, *ps):
+        n = min(self.count, len(self.samples))
+        if n == 0:
+            return [float("nan")] * len(ps)
+        return list(np.percentile(self.samples[:n], ps))
+
+    def summary(self):
+        p50, p99 = self.percentiles(50, 99)
+        n = min(self.count, len(self.samples))
+        worst = self.samples[:n].max() if n else float("nan")
+        return f"p50 {p50 * 1000:.2f} ms  p99 {p99 * 1000:.2f} ms  max {worst * 1000:.2f} ms"
@@ -1,16 +1,21 @@
-import cv2
 import numpy as np
 import time
 import threading
-from picamera2 import Picamera2
+import os
 from brickpi3 import BrickPi3
+from predictor import TargetPredictor
+from capture import DualStreamCamera
+from replay import ReplayCamera
+from worker import VisionWorker
+from scheduler import PeriodicScheduler
+from motors import MotorDriver
+from latency import LatencyTrace
+from odometry import Odometry
 
 # ==========================================================
-#              SHARED VARIABLES (THREAD SAFE)
+#        SHARED DETECTION (VISION PROCESS, LOCK-FREE)
 # ==========================================================
-center_x = None
-last_radius = 0
-lock = threading.Lock()
+vision = None          # VisionWorker, started in MAIN
 
 # ==========================================================
 #            CAMERA + CONTROL THRESHOLDS (TUNED)
@@ -25,134 +30,129 @@ ROTATE_LIMIT = 320
 
 # PID tuning (stable rotation)
 KP = 0.32
-KD = 0.18
-last_error = 0
+KD = 0.006             # s; the old 0.18 per frame-to-frame difference at ~30 fps
 
-# Radius thresholds (IMPORTANT, FIXED)
+# Control loop rate (fixed, monotonic; jitter and misses in motor_loop.stats())
+CONTROL_HZ = 100
+motor_loop = PeriodicScheduler(1.0 / CONTROL_HZ, name="motor loop", phase=0.0)
+
+# Radius thresholds (IMPORTANT, FIXED): lores px of the 320x320 central crop,
+# the same geometry as the original RGB888 stream, so they still hold
 RADIUS_FULL = 130      # FULL FRAME → BACKWARD
 RADIUS_NEAR = 95       # VERY CLOSE → STOP
 RADIUS_FAR = 70        # FAR ENOUGH → FORWARD
 
 CENTER_TOL = 30        # if inside ±30 px → centered
 
+# Preview windows (0 → headless, no HighGUI calls at all)
+PREVIEW_FPS = 5 if os.environ.get("DISPLAY") else 0
+
+# Print the control loop timing while running (seconds)
+STATS_EVERY = 10
+
+# Per-hop glass-to-motor latency; LATENCY_TRACE=trace.bin also writes every
+# frame to a file for latency-report.py.  Created in MAIN: the spawned
+# vision process re-imports this file and would truncate the trace.
+trace = None
+
 
 # ==========================================================
 #                          MOTORS
 # ==========================================================
-BP = BrickPi3()
-LEFT = BP.PORT_D
-RIGHT = BP.PORT_C
+BP = None              # created in MAIN, so the vision process never opens SPI
+motors = None          # MotorDriver over BP: unchanged commands skip the SPI write
+odometry = None        # encoder pose, started in MAIN
+ODOMETRY_HZ = 100
+ODOMETRY_PHASE = 0.5 / CONTROL_HZ   # encoder reads land between motor ticks
+LEFT = BrickPi3.PORT_D
+RIGHT = BrickPi3.PORT_C
 
 def set_motors(left, right):
-    BP.set_motor_dps(LEFT, left)
-    BP.set_motor_dps(RIGHT, right)
+    motors.set_dps(LEFT, left)
+    motors.set_dps(RIGHT, right)
 
 def stop_motors():
-    BP.set_motor_power(LEFT, 0)
-    BP.set_motor_power(RIGHT, 0)
+    motors.stop(LEFT, RIGHT)
 
 
 # ==========================================================
-#                   CAMERA THREAD (DETECTION)
+#             VISION PROCESS (DETECTION SETTINGS)
 # ==========================================================
-def camera_thread():
-    global center_x, last_radius
-
-    pic = Picamera2()
-    pic.configure(picap_config := pic.create_preview_configuration(
-        main={"format": "RGB888", "size": (320, 320)}
-    ))
-    pic.start()
-
-    kernel = np.ones((5, 5), np.uint8)
-
-    # HSV for green (stable)
-    LOWER = np.array([35, 70, 60])
-    UPPER = np.array([90, 255, 255])
-
-    while True:
-        frame = pic.capture_array()
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-        mask = cv2.inRange(hsv, LOWER, UPPER)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-
-        cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        cx, radius = None, 0
-
-        if cnts:
-            c = max(cnts, key=cv2.contourArea)
-            if cv2.contourArea(c) > 300:
-                M = cv2.moments(c)
-                if M["m00"] != 0:
-                    cx = int(M["m10"] / M["m00"])
-                (_, _), radius = cv2.minEnclosingCircle(c)
-
-        with lock:
-            center_x = cx
-            last_radius = radius
-
-        cv2.imshow("Frame", frame)
-        cv2.imshow("Mask", mask)
-
-        if cv2.waitKey(1) & 0xFF == 27:
-            break
-
-    pic.stop()
-    cv2.destroyAllWindows()
+# HSV for green (stable)
+LOWER = np.array([35, 70, 60])
+UPPER = np.array([90, 255, 255])
 
 
 # ==========================================================
 #               MOTOR THREAD (FINAL BEHAVIOR)
 # ==========================================================
 def motor_thread():
-    global last_error
-
-    while True:
-        with lock:
-            cx = center_x
-            radius = last_radius
+    # constant-velocity Kalman between detection and the PID
+    predictor = TargetPredictor(max_gap=0.25)
+    last_seq = 0
+    # PID memory lives with the only thread that uses it
+    last_error, last_error_time = 0.0, None
+    det, fresh, picked_up = None, False, 0.0
+    tracking = False
+
+    def tick():
+        """One control step; True if it commanded the motors."""
+        nonlocal last_seq, last_error, last_error_time, det, fresh, picked_up, tracking
+
+        # newest detection from the vision process (never blocks it);
+        # feed each one once, then extrapolate to this tick
+        seq, det = vision.latest()
+        fresh = seq != last_seq
+        if fresh:
+            picked_up = time.monotonic()
+            cx = None if np.isnan(det.cx) else det.cx
+            predictor.update(cx, det.radius, det.capture_time)
+            last_seq = seq
+
+        now = time.monotonic()
+        est = predictor.predict(now)
+        cx, radius = (est.cx, est.radius) if est else (None, 0)
+        tracking = cx is not None
 
         # ------------------------------------------------------
         # 1. OBJECT LOST → STOP
         # ------------------------------------------------------
         if cx is None:
             stop_motors()
-            time.sleep(0.01)
-            continue
+            last_error_time = None
+            return True
 
         # ------------------------------------------------------
         # 2. FULL SCREEN COVERED → REVERSE
         # ------------------------------------------------------
         if radius > RADIUS_FULL:
             set_motors(-REVERSE_SPEED, -REVERSE_SPEED)
-            time.sleep(0.01)
-            continue
+            return True
 
         # ------------------------------------------------------
         # 3. OBJECT CLOSE BUT NOT FULL → STOP
         # ------------------------------------------------------
         if RADIUS_NEAR < radius <= RADIUS_FULL:
             stop_motors()
-            time.sleep(0.01)
-            continue
+            return True
 
         # ------------------------------------------------------
         # 4. OBJECT FAR → MOVE FORWARD (NOW FIXED!)
         # ------------------------------------------------------
         if radius < RADIUS_FAR:
             set_motors(FORWARD_SPEED, FORWARD_SPEED)
-            time.sleep(0.01)
-            continue
+            return True
 
         # ------------------------------------------------------
         # 5. OBJECT MID-RANGE → PID ROTATION
         # ------------------------------------------------------
         error = cx - CENTER
-        derivative = error - last_error
-        last_error = error
+        # D term over the real time since the last PID update (px/s)
+        if last_error_time is None:
+            derivative = 0.0
+        else:
+            derivative = (error - last_error) / max(now - last_error_time, 1e-3)
+        last_error, last_error_time = error, now
 
         rotation = KP * error + KD * derivative
         rotation = np.clip(rotation, -ROTATE_LIMIT, ROTATE_LIMIT)
@@ -160,33 +160,81 @@ def motor_thread():
         # centered → forward
         if abs(error) < CENTER_TOL:
             set_motors(FORWARD_SPEED, FORWARD_SPEED)
-            time.sleep(0.01)
-            continue
+            return True
 
         # rotate left/right
         set_motors(-rotation, rotation)
-        time.sleep(0.01)
+        return True
+
+    def traced_tick():
+        # the first motor write that used a new detection closes its trace
+        if tick() and fresh:
+            trace.record(det.frame_id, det.capture_time, det.ring_time, det.detect_start,
+                         det.publish_time, picked_up, time.monotonic())
+        return tracking
+
+    # 100 Hz while there is a target to steer to; with none (motors already
+    # stopped) sleep until the vision process publishes the next detection
+    motor_loop.run(traced_tick, wake=lambda timeout: vision.wait_for(last_seq, timeout))
 
 
 # ==========================================================
 #                           MAIN
 # ==========================================================
-try:
-    t1 = threading.Thread(target=camera_thread, daemon=True)
-    t2 = threading.Thread(target=motor_thread, daemon=True)
-
-    t1.start()
-    t2.start()
-
-    print("Robot Running... Press CTRL + C to stop.")
-
-    while True:
-        time.sleep(1)
-
-except KeyboardInterrupt:
-    pass
-
-finally:
-    stop_motors()
-    BP.reset_all()
-    print("Robot Stopped Safely")
+if __name__ == "__main__":
+    BP = BrickPi3()
+    trace = LatencyTrace(os.environ.get("LATENCY_TRACE"))
+    motors = MotorDriver(BP)
+    odometry = Odometry(motors, left=((LEFT, 1),), right=((RIGHT, 1),), rate=ODOMETRY_HZ,
+                        phase=ODOMETRY_PHASE)
+
+    # detection reads the lores YUV planes in its own process (frames go
+    # through shared memory); nothing here shows main, so it keeps the lores
+    # size: same 320x320 crop the radius thresholds were tuned on, and no
+    # high-resolution buffer filled for nobody
+    # (REPLAY=clip.npy runs on a lores recording, REPLAY_REALTIME=1 paces it)
+    if os.environ.get("REPLAY"):
+        cam = ReplayCamera(os.environ["REPLAY"], realtime=os.environ.get("REPLAY_REALTIME") == "1")
+    else:
+        cam = DualStreamCamera(lores_size=(FRAME_W, FRAME_W), main_size=(FRAME_W, FRAME_W))
+    vision = VisionWorker(cam, LOWER, UPPER, preview_fps=PREVIEW_FPS)
+
+    try:
+        cam.start()             # before the capture thread asks for frames
+        vision.start()
+        odometry.start()
+
+        t2 = threading.Thread(target=motor_thread, daemon=True)
+
+        t2.start()
+
+        print("Robot Running... Press CTRL + C to stop.")
+
+        # ESC in the preview ends the vision process
+        last_report = time.monotonic()
+        while vision.alive:
+            time.sleep(1)
+            if time.monotonic() - last_report >= STATS_EVERY:
+                print(motor_loop.summary())
+                print(f"Pose: {odometry.summary()}")
+                last_report = time.monotonic()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        # motors first, and every step on its own: a failing teardown
+        # (e.g. the capture thread still in the ring) must not skip the rest
+        for step in (motor_loop.stop, stop_motors, BP.reset_all,
+                     odometry.stop, vision.stop, cam.stop):
+            try:
+                step()
+            except Exception as e:
+                print(f"Shutdown: {step.__qualname__} failed: {e!r}")
+        print("Robot Stopped Safely")
+        print(motor_loop.summary())
+        print(f"Motor commands: {motors.summary()}")
+        print(f"Final pose: {odometry.summary()}")
+        print("Glass-to-motor latency:")
+        print(trace.report())
+        trace.close()
@@ -1,5 +1,6 @@
 import time
 import brickpi3
+from scheduler import PeriodicScheduler
 
 BP = brickpi3.BrickPi3()
 
@@ -8,22 +9,24 @@ BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_ULTRASONIC_CM)
 
 time.sleep(1)
 
-def sensor():
+SAMPLE_HZ = 1
+sensor_loop = PeriodicScheduler(1.0 / SAMPLE_HZ, name="ultrasonic")
+
+def read_sensor():
     try:
-        while True:
-            try:
-                distance = BP.get_sensor(BP.PORT_1)  # Read sensor on PORT_1
-                print(f"Sensor on PORT_1: {distance} cm")
-            except brickpi3.SensorError as error:
-                print(f"Sensor PORT_1 error: {error}")
+        distance = BP.get_sensor(BP.PORT_1)  # Read sensor on PORT_1
+        print(f"Sensor on PORT_1: {distance} cm")
+    except brickpi3.SensorError as error:
+        print(f"Sensor PORT_1 error: {error}")
 
-            time.sleep(1)
+def sensor():
+    try:
+        sensor_loop.run(read_sensor)
 
     except KeyboardInterrupt:
         BP.reset_all()
         print("Stopping program.")
+        print(sensor_loop.summary())
 
 # Run the function
 sensor()
-
-
@@ -0,0 +1,347 @@
+import threading
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+
+# ==========================================================
+#              GREEN TARGET DETECTION (ROI TRACKING)
+# ==========================================================
+class RoiTracker:
+    """Finds the largest green blob, searching only around the last hit.
+
+    While the target is tracked, only a window of ``margin`` x radius
+    around the last centroid is converted and thresholded.  Every missed
+    frame grows the window by ``grow``; after ``max_misses`` misses the
+    tracker falls back to a full-frame search.
+    """
+
+    def __init__(self, lower, upper, min_area=300, kernel_size=5,
+                 margin=2.5, grow=1.6, max_misses=4, classifier=None):
+        self.lower = np.asarray(lower)
+        self.upper = np.asarray(upper)
+        # optional HsvLut, needed when frames are not BGR (e.g. lores YUV)
+        self.classifier = classifier
+        if classifier is not None:
+            classifier.update(self.lower, self.upper)
+        self.min_area = min_area
+        self.kernel = np.ones((kernel_size, kernel_size), np.uint8)
+        self.margin = margin
+        self.grow = grow
+        self.max_misses = max_misses
+
+        self.last = None        # (x, y, radius) of the last hit
+        self.misses = 0
+        self.window = None      # (x0, y0, x1, y1) searched last frame
+        self.mask = None        # full-size mask, only the window is valid
+
+    def reset(self):
+        self.last = None
+        self.misses = 0
+
+    def _search_window(self, w, h):
+        if self.last is None:
+            return 0, 0, w, h
+
+        x, y, r = self.last
+        pad = self.kernel.shape[0] * 2
+        half = int(r * self.margin * (self.grow ** self.misses)) + pad
+
+        x0, y0 = max(0, int(x) - half), max(0, int(y) - half)
+        x1, y1 = min(w, int(x) + half), min(h, int(y) + half)
+        if x1 - x0 < 2 * pad or y1 - y0 < 2 * pad:
+            return 0, 0, w, h
+        return x0, y0, x1, y1
+
+    def detect(self, frame):
+        """Return ((cx, cy), radius) in frame coordinates, or (None, 0)."""
+        h, w = frame.shape[:2]
+        if self.mask is None or self.mask.shape != (h, w):
+            self.mask = np.zeros((h, w), np.uint8)
+
+        x0, y0, x1, y1 = self._search_window(w, h)
+        self.window = (x0, y0, x1, y1)
+
+        if self.classifier is not None:
+            mask = self.classifier.mask(frame[y0:y1, x0:x1])
+        else:
+            hsv = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2HSV)
+            mask = cv2.inRange(hsv, self.lower, self.upper)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.kernel)
+
+        self.mask[:] = 0
+        self.mask[y0:y1, x0:x1] = mask
+
+        cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        center, radius = None, 0
+        if cnts:
+            c = max(cnts, key=cv2.contourArea)
+            if cv2.contourArea(c) > self.min_area:
+                M = cv2.moments(c)
+                (_, _), radius = cv2.minEnclosingCircle(c)
+                if M["m00"] != 0:
+                    center = (int(M["m10"] / M["m00"]) + x0,
+                              int(M["m01"] / M["m00"]) + y0)
+
+        if center is not None:
+            self.last = (center[0], center[1], radius)
+            self.misses = 0
+        elif self.last is not None:
+            self.misses += 1
+            if self.misses > self.max_misses:
+                self.reset()
+
+        return center, radius
+
+
+# ==========================================================
+#          RING DETECTION (detect_ring, AS PIPELINE STAGES)
+# ==========================================================
+def ring_stages(classifier, min_area=500, kernel_size=5, blur_size=11):
+    """detect_ring split into (name, fn) stages for pipeline.FramePipeline.
+
+    Each stage reads and extends a job dict holding ``frame``, ``lower``
+    and ``upper``; the last one adds ``center`` and ``mask`` and draws the
+    ring on the frame, like the original detect_ring.  ``blur_size=None``
+    skips the GaussianBlur.
+    """
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+
+    def blur(job):
+        if blur_size:
+            job["blurred"] = cv2.GaussianBlur(job["frame"], (blur_size, blur_size), 0)
+        else:
+            job["blurred"] = job["frame"]
+
+    def threshold(job):
+        classifier.update(job["lower"], job["upper"])  # no-op unless a trackbar moved
+        job["mask"] = classifier.mask(job["blurred"])
+
+    def morphology(job):
+        mask = cv2.morphologyEx(job["mask"], cv2.MORPH_OPEN, kernel)
+        job["mask"] = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    def contours(job):
+        frame = job["frame"]
+        cnts, _ = cv2.findContours(job["mask"], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        center = None
+        if cnts:
+            c = max(cnts, key=cv2.contourArea)
+            if cv2.contourArea(c) > min_area:
+                ((x, y), radius) = cv2.minEnclosingCircle(c)
+                M = cv2.moments(c)
+                if M["m00"] > 0:
+                    center = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
+                    if radius > 10:
+                        cv2.circle(frame, (int(x), int(y)), int(radius), (0, 255, 255), 2)
+                        cv2.circle(frame, center, 5, (0, 0, 255), -1)
+        job["center"] = center
+
+    return [("blur", blur), ("threshold", threshold),
+            ("morphology", morphology), ("contours", contours)]
+
+
+def detect_ring(frame, lower_green, upper_green, stages):
+    """Run the ring stages back to back on one frame; returns (center, mask)."""
+    job = {"frame": frame, "lower": lower_green, "upper": upper_green}
+    for _, fn in stages:
+        fn(job)
+    return job["center"], job["mask"]
+
+
+def detect_ring_batch(frames, classifier, min_area=500, kernel_size=5, blur_size=11):
+    """detect_ring over many frames with one call per stage.
+
+    Frames of the same size are stacked into one tall image with black
+    separator rows between them, so blur, threshold and morphology each
+    run once per batch, and one findContours pass assigns every contour to
+    the frame it lies in.  Frame edges blur against the separator rather
+    than a reflected border, which only matters for a ring cut by the
+    edge.  Returns one (cx, cy, radius) or None per frame, in order;
+    ``classifier`` must already hold the bounds.  Nothing is drawn.
+    """
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    pad = max(blur_size or 0, kernel_size)
+    results = [None] * len(frames)
+
+    groups = {}
+    for i, frame in enumerate(frames):
+        groups.setdefault(frame.shape, []).append(i)
+
+    for shape, members in groups.items():
+        h = shape[0]
+        pitch = h + pad
+        tall = np.zeros((pitch * len(members) - pad,) + shape[1:], np.uint8)
+        for k, i in enumerate(members):
+            tall[k * pitch:k * pitch + h] = frames[i]
+
+        if blur_size:
+            tall = cv2.GaussianBlur(tall, (blur_size, blur_size), 0)
+        mask = classifier.mask(tall)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+        for k in range(1, len(members)):
+            mask[k * pitch - pad:k * pitch] = 0     # no blob may span two frames
+
+        best = {}   # k -> (area, contour), largest per frame
+        cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for c in cnts:
+            area = cv2.contourArea(c)
+            k = int(c[0, 0, 1]) // pitch
+            if area > min_area and (k not in best or area > best[k][0]):
+                best[k] = (area, c)
+
+        for k, (_, c) in best.items():
+            (_, _), radius = cv2.minEnclosingCircle(c)
+            M = cv2.moments(c)
+            if M["m00"] > 0:
+                results[members[k]] = (M["m10"] / M["m00"], M["m01"] / M["m00"] - k * pitch, radius)
+    return results
+
+
+# ==========================================================
+#          MULTI-TARGET DETECTION (ONE CONTOUR PASS)
+# ==========================================================
+Blob = namedtuple("Blob", "area bbox centroid")
+
+
+def find_blobs(mask, min_area=300, k=8, method="contours"):
+    """Every blob in ``mask`` bigger than ``min_area``, largest first.
+
+    Returns at most ``k`` Blob(area, bbox=(x, y, w, h), centroid=(x, y)).
+
+    ``method="contours"`` does one findContours pass, ranks all contours
+    by contourArea (the same area the 300/500 px script thresholds were
+    tuned on) and only computes moments and bounding boxes for the top
+    ``k``.  That is the single-target path plus one moments/boundingRect
+    per extra blob reported: bench-blobs.py measured +5% to +70% over it
+    with k=8, the most on 20-blob masks where the extra work is a bigger
+    share, and about the same cost with k=1.
+
+    ``method="cc"`` uses one connectedComponentsWithStats pass and reports
+    pixel counts instead; it is exact for blobs with holes but measured
+    2-8x slower than contours on 320x320 and 640x480 masks, so it is not
+    the default.
+    """
+    if method == "cc":
+        _, _, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+            mask, 8, cv2.CV_32S, cv2.CCL_BBDT)
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        keep = np.flatnonzero(areas > min_area)
+        if len(keep) > k:
+            keep = keep[np.argpartition(areas[keep], -k)[-k:]]
+        keep = keep[np.argsort(-areas[keep], kind="stable")] + 1
+
+        return [Blob(int(stats[i, cv2.CC_STAT_AREA]),
+                     tuple(int(v) for v in stats[i, :4]),
+                     (float(centroids[i, 0]), float(centroids[i, 1])))
+                for i in keep]
+
+    cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    areas = np.array([cv2.contourArea(c) for c in cnts])
+    keep = np.flatnonzero(areas > min_area)
+    if len(keep) > k:
+        keep = keep[np.argpartition(areas[keep], -k)[-k:]]
+    keep = keep[np.argsort(-areas[keep], kind="stable")]
+
+    blobs = []
+    for i in keep:
+        M = cv2.moments(cnts[i])
+        if M["m00"] == 0:
+            continue
+        blobs.append(Blob(float(areas[i]), cv2.boundingRect(cnts[i]),
+                          (M["m10"] / M["m00"], M["m01"] / M["m00"])))
+    return blobs
+
+
+# ==========================================================
+#            HSV THRESHOLD LOOKUP TABLE (BGR -> MASK)
+# ==========================================================
+class HsvLut:
+    """Replaces cvtColor(BGR2HSV) + inRange with one table lookup.
+
+    The table holds the inRange result for every BGR colour quantised to
+    ``bits`` bits per channel (sampled at the centre of each bin) and is
+    only rebuilt when the thresholds change.  Pixels can only disagree
+    with the exact path when their colour bin straddles a threshold, i.e.
+    within 2 ** (8 - bits) levels of it on some channel; on blurred
+    frames that is about 0.1% of pixels at 6 bits and 0.2% at 5 bits.
+
+    ``bits=None`` keeps the exact cvtColor + inRange path behind the same
+    interface.  OpenCV's SIMD colour conversion can beat the gather, so
+    run bench-hsv-lut.py on the target before switching the table on.
+
+    ``space="yuv"`` classifies full-range (JPEG) Y, U, V pixels, such as
+    the Picamera2 lores stream, against the same HSV bounds.
+    """
+
+    def __init__(self, bits=6, space="bgr"):
+        self.bits = bits
+        self.space = space
+        # (bounds, lower, upper, table), replaced as a whole by update() so
+        # pipeline workers sharing the classifier never see half of a rebuild
+        self.state = (None, None, None, None)
+        self._local = threading.local()     # index scratch, one per thread
+        if bits is None:
+            return
+
+        # per-channel LUTs turn each 8-bit value into its share of the index
+        self.shift = 8 - bits
+        q = np.arange(256, dtype=np.int32) >> self.shift
+        self.index_luts = [(q << (2 * bits)).reshape(256, 1),
+                           (q << bits).reshape(256, 1),
+                           q.reshape(256, 1)]
+
+    bounds = property(lambda self: self.state[0])
+    lower = property(lambda self: self.state[1])
+    upper = property(lambda self: self.state[2])
+    table = property(lambda self: self.state[3])
+
+    def update(self, lower, upper):
+        """Rebuild the table if the HSV bounds differ from the current ones."""
+        bounds = (tuple(int(v) for v in lower), tuple(int(v) for v in upper))
+        if bounds == self.state[0]:
+            return False
+
+        lower, upper = np.array(bounds[0]), np.array(bounds[1])
+        table = None
+        if self.bits is not None:
+            n = 1 << self.bits
+            q = (np.arange(n, dtype=np.uint8) << self.shift) | (1 << (self.shift - 1))
+            b, g, r = np.meshgrid(q, q, q, indexing="ij")
+            colours = np.stack([b, g, r], axis=-1).reshape(-1, 1, 3)
+
+            hsv = cv2.cvtColor(self._to_bgr(colours), cv2.COLOR_BGR2HSV)
+            table = cv2.inRange(hsv, lower, upper).reshape(-1)
+        self.state = (bounds, lower, upper, table)
+        return True
+
+    def mask(self, frame):
+        """Return the 0/255 mask for a frame in this classifier's space
+        (BGR, or full-range YUV with ``space="yuv"``)."""
+        _, lower, upper, table = self.state
+        if lower is None:
+            raise RuntimeError("HsvLut.mask() called before update()")
+        if self.bits is None:
+            hsv = cv2.cvtColor(self._to_bgr(frame), cv2.COLOR_BGR2HSV)
+            return cv2.inRange(hsv, lower, upper)
+
+        h, w = frame.shape[:2]
+        idx = getattr(self._local, "idx", None)
+        if idx is None or idx.shape != (h, w):
+            idx = self._local.idx = np.empty((h, w), np.int32)
+
+        b, g, r = cv2.split(frame)
+        lut_b, lut_g, lut_r = self.index_luts
+        cv2.add(cv2.LUT(b, lut_b), cv2.LUT(g, lut_g), dst=idx)
+        cv2.add(idx, cv2.LUT(r, lut_r), dst=idx)
+        return table.take(idx)
+
+    def _to_bgr(self, pixels):
+        if self.space == "yuv":
+            # OpenCV's YCrCb is full-range BT.601 with the chroma swapped
+            return cv2.cvtColor(pixels[..., [0, 2, 1]], cv2.COLOR_YCrCb2BGR)
+        return pixels
@@ -1,10 +1,14 @@
-from picamera2 import Picamera2
 import cv2
 import numpy as np
 from collections import deque
 from brickpi3 import BrickPi3
+from vision import HsvLut, ring_stages
+from pipeline import FramePipeline
+from motors import MotorDriver
+from odometry import Odometry
 import json
 import os
+from replay import ReplayCamera
 import time
 
 # ----- HSV CONFIG -----
@@ -16,7 +20,12 @@ else:
     hsv_config = {"LH": 35, "LS": 80, "LV": 60, "UH": 85, "US": 255, "UV": 255}
 
 # ----- CAMERA SETUP -----
-picam2 = Picamera2()
+# REPLAY=clip.npy runs on a recording (REPLAY_REALTIME=1 paces it)
+if os.environ.get("REPLAY"):
+    picam2 = ReplayCamera(os.environ["REPLAY"], realtime=os.environ.get("REPLAY_REALTIME") == "1")
+else:
+    from picamera2 import Picamera2
+    picam2 = Picamera2()
 config = picam2.create_preview_configuration(main={"format": "RGB888", "size": (320, 320)})
 picam2.configure(config)
 picam2.start()
@@ -36,41 +45,43 @@ cv2.createTrackbar("UV","Trackbars",hsv_config["UV"],255,nothing)
 
 # ----- MOTOR SETUP -----
 BP = BrickPi3()
+motors = MotorDriver(BP)   # skips set_motor_dps writes that would change nothing
 A = BP.PORT_A
 B = BP.PORT_C
 C = BP.PORT_B
 D = BP.PORT_D
+
+# encoder pose: A/D drive the left side mirrored, B/C the right
+odometry = Odometry(motors, left=((A, -1), (D, -1)), right=((B, 1), (C, 1)))
+odometry.start()
 DEFAULT_SPEED = 1000
 
 def forward(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(A, -speed)
-    BP.set_motor_dps(B, speed)
-    BP.set_motor_dps(C, speed)
-    BP.set_motor_dps(D, -speed)
+    motors.set_dps(A, -speed)
+    motors.set_dps(B, speed)
+    motors.set_dps(C, speed)
+    motors.set_dps(D, -speed)
 
 def backward(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(A, speed)
-    BP.set_motor_dps(B, -speed)
-    BP.set_motor_dps(C, -speed)
-    BP.set_motor_dps(D, speed)
+    motors.set_dps(A, speed)
+    motors.set_dps(B, -speed)
+    motors.set_dps(C, -speed)
+    motors.set_dps(D, speed)
 
 def rotate_clockwise(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(A, -speed)
-    BP.set_motor_dps(B, -speed)
-    BP.set_motor_dps(C, -speed)
-    BP.set_motor_dps(D, -speed)
+    motors.set_dps(A, -speed)
+    motors.set_dps(B, -speed)
+    motors.set_dps(C, -speed)
+    motors.set_dps(D, -speed)
 
 def rotate_anticlockwise(speed=DEFAULT_SPEED):
-    BP.set_motor_dps(A, speed)
-    BP.set_motor_dps(B, speed)
-    BP.set_motor_dps(C, speed)
-    BP.set_motor_dps(D, speed)
+    motors.set_dps(A, speed)
+    motors.set_dps(B, speed)
+    motors.set_dps(C, speed)
+    motors.set_dps(D, speed)
 
 def stop_motors():
-    BP.set_motor_power(A, 0)
-    BP.set_motor_power(B, 0)
-    BP.set_motor_power(C, 0)
-    BP.set_motor_power(D, 0)
+    motors.stop(A, B, C, D)
 
 # ----- FRAME SETTINGS -----
 FRAME_WIDTH = 320
@@ -78,28 +89,17 @@ CENTER_X = FRAME_WIDTH // 2
 TOLERANCE = 30
 
 # ----- DETECT RING -----
-def detect_ring(frame, lower_green, upper_green):
-    blurred = cv2.GaussianBlur(frame, (11,11),0)
-    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
-    mask = cv2.inRange(hsv, lower_green, upper_green)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((5,5),np.uint8))
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((5,5),np.uint8))
-    
-    contours,_ = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    center = None
-    if contours:
-        c = max(contours, key=cv2.contourArea)
-        if cv2.contourArea(c) > 500:
-            ((x,y), radius) = cv2.minEnclosingCircle(c)
-            M = cv2.moments(c)
-            if M["m00"] > 0:
-                center = (int(M["m10"]/M["m00"]), int(M["m01"]/M["m00"]))
-                if radius > 10:
-                    cv2.circle(frame,(int(x),int(y)),int(radius),(0,255,255),2)
-                    cv2.circle(frame,center,5,(0,0,255),-1)
-    return center, mask
+HSV_LUT_BITS = None  # 5 or 6 to use the lookup table (see bench-hsv-lut.py)
+classifier = HsvLut(bits=HSV_LUT_BITS)
+
+# blur, threshold, morphology and contours run on worker threads;
+# results come back in frame order, a few frames behind the camera
+PIPELINE_WORKERS = 3
+RESULT_TIMEOUT = 0.5    # s without a result before the motors stop
+ring_pipeline = FramePipeline(ring_stages(classifier, min_area=500), workers=PIPELINE_WORKERS)
 
 # ----- MAIN LOOP -----
+last_result = time.monotonic()
 try:
     while True:
         frame = picam2.capture_array()
@@ -114,32 +114,38 @@ try:
         lower_green = np.array([lh,ls,lv])
         upper_green = np.array([uh,us,uv])
 
-        # Detect ring
-        center, mask = detect_ring(frame, lower_green, upper_green)
-        pts.appendleft(center)
-
-        # Draw path
-        for i in range(1,len(pts)):
-            if pts[i-1] is None or pts[i] is None:
-                continue
-            thickness = int(np.sqrt(100/float(i+1))*2.5)
-            cv2.line(frame, pts[i-1], pts[i], (0,0,255), thickness)
-
-        # ----- AUTOMATIC MOTOR CONTROL -----
-        if center:
-            x, y = center
-            if x < CENTER_X - TOLERANCE:
-                rotate_anticlockwise()
-            elif x > CENTER_X + TOLERANCE:
-                rotate_clockwise()
+        # Detect ring (None while the pipeline fills up or a frame runs late;
+        # a stage that raised is re-raised here and ends the run)
+        job = ring_pipeline.process(frame, lower=lower_green, upper=upper_green)
+        if job is not None:
+            last_result = time.monotonic()
+            frame, center, mask = job["frame"], job["center"], job["mask"]
+            pts.appendleft(center)
+
+            # Draw path
+            for i in range(1,len(pts)):
+                if pts[i-1] is None or pts[i] is None:
+                    continue
+                thickness = int(np.sqrt(100/float(i+1))*2.5)
+                cv2.line(frame, pts[i-1], pts[i], (0,0,255), thickness)
+
+            # ----- AUTOMATIC MOTOR CONTROL -----
+            if center:
+                x, y = center
+                if x < CENTER_X - TOLERANCE:
+                    rotate_anticlockwise()
+                elif x > CENTER_X + TOLERANCE:
+                    rotate_clockwise()
+                else:
+                    forward()
             else:
-                forward()
-        else:
-            stop_motors()
+                stop_motors()
 
-        # Show frames
-        cv2.imshow("Frame", frame)
-        cv2.imshow("Mask", mask)
+            # Show frames
+            cv2.imshow("Frame", frame)
+            cv2.imshow("Mask", mask)
+        elif time.monotonic() - last_result > RESULT_TIMEOUT:
+            stop_motors()       # no fresh result: don't keep driving on an old one
 
         key = cv2.waitKey(1) & 0xFF
         if key == 27:  # ESC
@@ -152,7 +158,13 @@ except KeyboardInterrupt:
     print("Program stopped by user.")
 
 finally:
-    stop_motors()
-    cv2.destroyAllWindows()
-    picam2.stop()
-    BP.reset_all()
+    # motors first, and every step on its own so one failure skips nothing
+    for step in (stop_motors, BP.reset_all, ring_pipeline.close, odometry.stop,
+                 cv2.destroyAllWindows, picam2.stop):
+        try:
+            step()
+        except Exception as e:
+            print(f"Shutdown: {step.__qualname__} failed: {e!r}")
+    print(ring_pipeline.report())
+    print(f"Motor commands: {motors.summary()}")
+    print(f"Final pose: {odometry.summary()}")
@@ -0,0 +1,225 @@
+import multiprocessing as mp
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from shared import SeqSlot, memory_fence
+
+
+# ==========================================================
+#              SHARED-MEMORY FRAME RING (1 WRITER)
+# ==========================================================
+class SharedFrameRing:
+    """Frame slots in shared memory plus a header saying what each holds.
+
+    Header row per slot: (frame id, capture time, time it landed here);
+    frame id is -1 while the slot is being written.  ``header[-1, 0]`` is
+    the newest slot.  A reader checks the slot's frame id again after
+    using the pixels and throws the result away if the writer came round
+    in the meantime.  Fences keep the id stores on either side of the
+    pixel stores, and the reader's id loads on either side of its pixel
+    loads (see memory_fence).
+    """
+
+    def __init__(self, shape, slots=4, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        frame_bytes = int(np.prod(self.shape))
+        size = slots * frame_bytes + (slots + 1) * 3 * 8
+
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.frames = np.ndarray((slots,) + self.shape, np.uint8, buffer=self.shm.buf)
+        self.header = np.ndarray((slots + 1, 3), np.float64, buffer=self.shm.buf,
+                                 offset=slots * frame_bytes)
+        if self.owner:
+            self.header[:] = -1
+        self.next_id = 0
+
+    def write(self, camera):
+        """Capture the next frame into the oldest slot; returns its frame id."""
+        slot = (int(self.header[-1, 0]) + 1) % self.slots
+        self.header[slot, 0] = -1
+        memory_fence()
+        ts = camera.capture_into(self.frames[slot])
+        self.header[slot, 1] = ts
+        self.header[slot, 2] = time.monotonic()
+        memory_fence()
+        self.header[slot, 0] = self.next_id
+        memory_fence()
+        self.header[-1, 0] = slot
+        self.next_id += 1
+        return self.next_id - 1
+
+    def latest(self):
+        """(slot, frame id, capture time, ring time) of the newest frame, or None."""
+        slot = int(self.header[-1, 0])
+        if slot < 0:
+            return None
+        memory_fence()
+        frame_id, ts, written = self.header[slot]
+        if frame_id < 0:
+            return None
+        memory_fence()          # pixels are read after the id
+        return slot, int(frame_id), ts, written
+
+    def still_valid(self, slot, frame_id):
+        memory_fence()          # ... and the id again after the pixels
+        return self.header[slot, 0] == frame_id
+
+    def close(self):
+        del self.frames, self.header
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# ==========================================================
+#          VISION PROCESS (DETECTION OFF THE MOTOR GIL)
+# ==========================================================
+# capture → ring → detect_start → publish: the vision half of the
+# glass-to-motor trace (see latency.py)
+DETECTION_FIELDS = ("frame_id", "capture_time", "ring_time", "detect_start",
+                    "cx", "cy", "radius", "publish_time")
+
+
+def _vision_main(ring_name, result_name, shape, lores_size, lower, upper,
+                 frame_ready, detection_ready, stop, preview_fps):
+    # runs in the child process: only numpy/OpenCV, no BrickPi3, no camera;
+    # Ctrl+C is the parent's to handle, it stops us through ``stop``
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from capture import yuv420_planes, yuv_half
+    from preview import PreviewSink, FpsMeter
+    from vision import RoiTracker, HsvLut
+
+    ring = SharedFrameRing(shape, name=ring_name)
+    result_shm = shared_memory.SharedMemory(name=result_name)
+    result = SeqSlot(DETECTION_FIELDS, result_shm.buf)
+
+    w, h = lores_size
+    frame = np.empty((h // 2, w // 2, 3), np.uint8)
+    tracker = RoiTracker(lower, upper, min_area=300 / 4, kernel_size=3,
+                         classifier=HsvLut(bits=6, space="yuv"))
+    preview = PreviewSink(preview_fps) if preview_fps else None
+    fps = FpsMeter("detection (process)")
+    last_id = -1
+
+    try:
+        while not stop.is_set():
+            if not frame_ready.wait(0.1):
+                continue
+            frame_ready.clear()
+
+            latest = ring.latest()
+            if latest is None or latest[1] == last_id:
+                continue
+            slot, frame_id, ts, written = latest
+            last_id = frame_id
+            start = time.monotonic()
+
+            yuv_half(*yuv420_planes(ring.frames[slot], w, h), out=frame)
+            if not ring.still_valid(slot, frame_id):
+                continue        # overwritten while we copied it
+
+            center, radius = tracker.detect(frame)
+            cx, cy = (center[0] * 2, center[1] * 2) if center else (None, None)
+            result.write(frame_id, ts, written, start, cx, cy, radius * 2, time.monotonic())
+            detection_ready.set()
+
+            fps.tick("(preview)" if preview else "(headless)")
+            if preview:
+                preview.show(Frame=frame[..., 0], Mask=tracker.mask)
+                if preview.closed:
+                    break
+    finally:
+        if preview:
+            preview.close()
+        del result
+        result_shm.close()
+        ring.close()
+
+
+class VisionWorker:
+    """Capture thread here, detection in a child process, shared memory between.
+
+    The capture thread only copies frames into the SharedFrameRing (the
+    copy releases the GIL), so the motor loop in this process no longer
+    competes with OpenCV's Python glue.  ``latest()`` reads the newest
+    detection from a lock-free SeqSlot; ``wait_for()`` sleeps until the
+    child publishes a newer one.
+    """
+
+    def __init__(self, camera, lower, upper, slots=4, preview_fps=0):
+        self.camera = camera
+        self.ring = SharedFrameRing(camera.lores_shape, slots)
+        self.result_shm = shared_memory.SharedMemory(
+            create=True, size=SeqSlot.nbytes(DETECTION_FIELDS))
+        self.result = SeqSlot(DETECTION_FIELDS, self.result_shm.buf)
+        self.result.array[:] = 0
+
+        ctx = mp.get_context("spawn")
+        self.frame_ready = ctx.Event()
+        self.detection_ready = ctx.Event()
+        self.stop_event = ctx.Event()
+        self.process = ctx.Process(
+            target=_vision_main, daemon=True,
+            args=(self.ring.shm.name, self.result_shm.name, camera.lores_shape,
+                  camera.lores_size, np.asarray(lower), np.asarray(upper),
+                  self.frame_ready, self.detection_ready, self.stop_event, preview_fps))
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+
+    def start(self):
+        # spawn before any capture thread exists
+        self.process.start()
+        self.thread.start()
+
+    def _capture_loop(self):
+        while not self.stop_event.is_set():
+            self.ring.write(self.camera)
+            self.frame_ready.set()
+
+    def latest(self):
+        """(seq, Record) of the newest detection; seq 0 until the first one."""
+        return self.result.read()
+
+    def wait_for(self, last_seq, timeout):
+        """(seq, Record) once a detection newer than ``last_seq`` is out.
+
+        Returns None if nothing new arrived within ``timeout`` seconds, so
+        the caller can run its lost-target watchdog.  One waiter only.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            # clear before checking, so a write in between still wakes us
+            self.detection_ready.clear()
+            seq, det = self.result.read()
+            if seq != last_seq:
+                return seq, det
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.detection_ready.wait(remaining):
+                return None
+
+    @property
+    def alive(self):
+        return self.process.is_alive()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=1)
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        if self.thread.is_alive():
+            # still inside capture_into() with a view on the ring: closing
+            # the mapping now raises BufferError.  Unlink the names so
+            # nothing leaks and let process exit unmap the rest.
+            self.result_shm.unlink()
+            self.ring.shm.unlink()
+            return
+        del self.result
+        self.result_shm.close()
+        self.result_shm.unlink()
+        self.ring.close()